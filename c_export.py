@@ -0,0 +1,192 @@
+'''
+
+c_export.py
+
+	exports the tables of a slr_pda / lr1_pda (or parse_service.parse_tables) as a static C++ header,
+	so the C++ front ends can parse with the generated tables. lr_driver.cpp is a reference driver of it.
+
+	the header (namespace rais::<name>):
+	enum terminal           the terminal enumeration, end_of_input last
+	action[state][terminal] 0: error, > 0: shift to state (a - 1), accept_action, otherwise: reduce production (-a - 1)
+	goto_table[state][var]  the goto state, -1 if none
+	production_length[p]    number of the states popped by reducing p
+	production_head[p]      the variable of p
+	entries[]               {entry variable, initial state}
+	parse(toks, n, entry)   table-driven parser, returns {accepted, index} like slr_pda.test
+
+	usage:
+	python c_export.py <grammer file> <header> [lalr | lr1 | slr] [namespace]
+
+'''
+
+
+import re
+import sys
+from grammer_preprocess import end_token, action_category
+
+
+header_template = \
+'''// generated by c_export.py{source}, do not edit
+#ifndef {guard}
+#define {guard}
+
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+#include <string_view>
+
+namespace rais {{
+namespace {name} {{
+
+enum terminal : int {{
+{terminals}
+}};
+
+constexpr int terminal_count   = {terminal_count}; // with end_of_input
+constexpr int state_count      = {state_count};
+constexpr int variable_count   = {variable_count};
+constexpr int production_count = {production_count};
+
+constexpr std::int32_t accept_action = INT32_MIN;
+
+constexpr const char* terminal_names[terminal_count] = {{
+{terminal_names}
+}};
+
+constexpr const char* variable_names[variable_count] = {{
+{variable_names}
+}};
+
+constexpr std::int32_t action[state_count][terminal_count] = {{
+{action}
+}};
+
+constexpr std::int32_t goto_table[state_count][variable_count] = {{
+{goto_table}
+}};
+
+constexpr std::int32_t production_length[production_count] = {{ {production_length} }};
+constexpr std::int32_t production_head[production_count] = {{ {production_head} }};
+
+struct entry {{ const char* variable; std::int32_t state; }};
+constexpr entry entries[] = {{ {entries} }};
+
+// the terminal of a name, -1 if there is no such terminal
+inline int terminal_of(std::string_view s) noexcept{{
+	for(int i = 0; i < terminal_count - 1; ++i) if(s == terminal_names[i]) return i;
+	return -1;
+}}
+
+struct parse_result {{
+	bool accepted;
+	std::ptrdiff_t index; // the last token if accepted (-1 for no token), the bad token if rejected
+}};
+
+// toks: terminal ids without end_of_input, entry: index of entries
+inline parse_result parse(const int* toks, std::size_t n, int entry = 0) {{
+	std::vector<std::int32_t> stack{{entries[entry].state}};
+	std::size_t i = 0;
+	while(true) {{
+		const int tok = i < n ? toks[i] : end_of_input;
+		const std::int32_t a = tok >= 0 && tok < terminal_count ? action[stack.back()][tok] : 0;
+		if(a == 0) return {{false, static_cast<std::ptrdiff_t>(i)}};
+		if(a == accept_action) return {{true, static_cast<std::ptrdiff_t>(i) - 1}};
+		if(a > 0) {{
+			// shift
+			stack.push_back(a - 1);
+			++i;
+		}}else {{
+			// reduce
+			const std::int32_t p = -a - 1;
+			stack.resize(stack.size() - production_length[p]);
+			stack.push_back(goto_table[stack.back()][production_head[p]]);
+		}}
+	}}
+}}
+
+}} //namespace {name}
+}} //namespace rais
+
+#endif //{guard}
+'''
+
+
+def table_symbols(pda):
+	# (terminals, variables) of the tables, in the order of their ids
+	terminals, variables = set(), set()
+	for row in pda.action:
+		for x, (category, arg) in row.items():
+			if category == action_category.GOTO: variables.add(x)
+			elif not isinstance(x, end_token): terminals.add(x)
+	heads = pda.heads if hasattr(pda, 'heads') else [p.head for p in pda.g.P]
+	return sorted(terminals), sorted(variables | set(heads))
+
+
+def c_string(s) -> str:
+	return '"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def export_header(pda, f, name = 'lr_tables', source = None):
+	# f: a text file to write the header to
+	if hasattr(pda, 'lengths'): # parse_service.parse_tables
+		lengths, heads = pda.lengths, pda.heads
+	else:
+		lengths = [len(p.body) if p.body[0] != 'ε' else 0 for p in pda.g.P]
+		heads = [p.head for p in pda.g.P]
+	terminals, variables = table_symbols(pda)
+	terminal_id = {t: i for i, t in enumerate(terminals)}
+	terminal_id[end_token()] = len(terminals)
+	variable_id = {v: i for i, v in enumerate(variables)}
+
+	enumerators, used = [], set()
+	for i, t in enumerate(terminals):
+		e = 't_' + re.sub(r'\W', '_', t) if re.fullmatch(r'\w+', t) else 't_' + str(i)
+		while e in used: e += '_'
+		used.add(e)
+		enumerators.append('\t{} = {}, // {}'.format(e, i, t))
+	enumerators.append('\tend_of_input = {}'.format(len(terminals)))
+
+	action_rows, goto_rows = [], []
+	for row in pda.action:
+		a = [0] * (len(terminals) + 1)
+		go = [-1] * len(variables)
+		for x, (category, arg) in row.items():
+			if category == action_category.GOTO: go[variable_id[x]] = arg
+			elif category == action_category.SHIFT: a[terminal_id[x]] = arg + 1
+			elif category == action_category.REDUCE: a[terminal_id[x]] = -arg - 1
+			elif category == action_category.ACCEPT: a[terminal_id[x]] = 'accept_action'
+		action_rows.append('\t{ ' + ', '.join(map(str, a)) + ' }')
+		goto_rows.append('\t{ ' + ', '.join(map(str, go)) + ' }')
+
+	guard = name.upper() + '_HPP'
+	f.write(header_template.format(
+		source = ' from ' + source if source else '',
+		guard = guard,
+		name = name,
+		terminals = '\n'.join(enumerators),
+		terminal_count = len(terminals) + 1,
+		state_count = len(pda.action),
+		variable_count = len(variables),
+		production_count = len(lengths),
+		terminal_names = ',\n'.join('\t' + c_string(t) for t in terminals + ['$']),
+		variable_names = ',\n'.join('\t' + c_string(v) for v in variables),
+		action = ',\n'.join(action_rows),
+		goto_table = ',\n'.join(goto_rows),
+		production_length = ', '.join(map(str, lengths)),
+		production_head = ', '.join(str(variable_id[h]) for h in heads),
+		entries = ', '.join('{{{}, {}}}'.format(c_string(v), s) for v, s in pda.entries.items())
+	))
+
+
+if __name__ == '__main__':
+	from grammer_preprocess import load_grammer, generator, slr_generator, lalr_generator, lr1_generator, slr_pda, lr1_pda
+	if len(sys.argv) < 3:
+		print(__doc__)
+		sys.exit()
+	with open(sys.argv[1]) as f: spec = load_grammer(f, sys.argv[1])
+	kind = sys.argv[3] if len(sys.argv) > 3 else 'lalr'
+	gen = generator(spec.P, spec.S)
+	if kind == 'slr': pda = slr_pda(slr_generator(gen))
+	else: pda = lr1_pda((lr1_generator if kind == 'lr1' else lalr_generator)(gen))
+	with open(sys.argv[2], 'w') as f:
+		export_header(pda, f, sys.argv[4] if len(sys.argv) > 4 else 'lr_tables', sys.argv[1])
@@ -0,0 +1,333 @@
+'''
+
+context_scanner.py
+
+	a context-aware scanner driven by the LR tables of grammer_preprocess.py,
+	in the style of Copper / tree-sitter: the scanner only tries the terminals
+	which are valid in the current parser state, so the same spelling can be
+	a keyword in one context and an identifier in another.
+
+	regex_nfa        Thompson NFA of the token patterns
+	scanner_dfa      lazily built subset DFA of the NFA, restricted to some terminals, longest match
+	context_scanner  per parser state: a bitset of the acceptable terminals and the DFA restricted to them
+
+	supported pattern grammer (the same subset as regular_expression/regular_expression.cpp):
+	concat
+	select            |
+	parens            ()
+	kleene closure    *
+	positive closure  +
+	optional          ?
+	wildcard          .
+	brackets          [...], [^...]
+	escapes           \\d \\w \\s \\n \\t and \\<any char>
+
+	usage:
+	scanner = context_scanner(pda, {'id': r'[a-zA-Z_]\\w*', 'num': r'\\d+'})
+	scanner.parse('x = if + then')
+
+'''
+
+
+from grammer_preprocess import end_token, action_category
+
+
+class scan_error(ValueError):
+	pass
+
+
+# a character class: (negated, ((lo, hi), ...))
+any_char    = (True, ())
+digit_chars = (False, (('0', '9'),))
+word_chars  = (False, (('0', '9'), ('a', 'z'), ('A', 'Z'), ('_', '_')))
+space_chars = (False, ((' ', ' '), ('\t', '\r')))
+
+escape_classes = {'d': digit_chars, 'w': word_chars, 's': space_chars}
+escape_chars   = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v', '0': '\0'}
+
+def class_has(char_class, ch) -> bool:
+	negated, ranges = char_class
+	return any(lo <= ch <= hi for lo, hi in ranges) != negated
+
+def literal(s) -> str:
+	# a pattern which matches s itself
+	return ''.join('\\' + c if c in '\\|()*+?.[]' else c for c in s)
+
+
+class regex_nfa:
+	# NFA M = (Q, Σ, δ, q0, F), the states are numbers
+	# eps[q]   : ε-edges of q
+	# edges[q] : [(char_class, target), ...]
+	# accept[q]: terminal accepted by q, or None
+	# starts   : terminal -> start state of its pattern
+
+	def __init__(self):
+		self.eps = list[list[int]]()
+		self.edges = list[list[tuple]]()
+		self.accept = list()
+		self.starts = dict[str, int]()
+		self.priority = dict[str, int]() # smaller wins when two terminals match the same longest lexeme
+
+	def new_state(self) -> int:
+		self.eps.append([])
+		self.edges.append([])
+		self.accept.append(None)
+		return len(self.eps) - 1
+
+	def add_pattern(self, terminal, pattern):
+		# compile pattern and accept terminal by it
+		self.pattern, self.pos = pattern, 0
+		start, end = self.parse_select()
+		if self.pos != len(pattern):
+			raise scan_error('unexpected {!r} at {} in pattern {!r}'.format(pattern[self.pos], self.pos, pattern))
+		self.accept[end] = terminal
+		self.starts[terminal] = start
+		self.priority[terminal] = len(self.priority)
+
+	# ---- recursive descent on the pattern, each of them returns an NFA fragment (start, end) ----
+	def peek(self):
+		return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+	def parse_select(self):
+		frag = self.parse_concat()
+		if self.peek() != '|': return frag
+		start, end = self.new_state(), self.new_state()
+		alternatives = [frag]
+		while self.peek() == '|':
+			self.pos += 1
+			alternatives.append(self.parse_concat())
+		for s, e in alternatives:
+			self.eps[start].append(s)
+			self.eps[e].append(end)
+		return start, end
+
+	def parse_concat(self):
+		start = end = self.new_state()
+		while self.peek() not in (None, '|', ')'):
+			s, e = self.parse_closure()
+			self.eps[end].append(s)
+			end = e
+		return start, end
+
+	def parse_closure(self):
+		s, e = self.parse_atom()
+		while (c := self.peek()) in ('*', '+', '?'):
+			self.pos += 1
+			start, end = self.new_state(), self.new_state()
+			self.eps[start].append(s)
+			self.eps[e].append(end)
+			if c != '+': self.eps[start].append(end) # may be skipped
+			if c != '?': self.eps[e].append(s)       # may be repeated
+			s, e = start, end
+		return s, e
+
+	def parse_atom(self):
+		c = self.peek()
+		if c is None or c in '*+?':
+			raise scan_error('expected an atom at {} in pattern {!r}'.format(self.pos, self.pattern))
+		self.pos += 1
+		if c == '(':
+			frag = self.parse_select()
+			if self.peek() != ')': raise scan_error('unclosed ( in pattern {!r}'.format(self.pattern))
+			self.pos += 1
+			return frag
+		if c == '[': char_class = self.parse_brackets()
+		elif c == '.': char_class = any_char
+		elif c == '\\': char_class = self.parse_escape()
+		else: char_class = (False, ((c, c),))
+		start, end = self.new_state(), self.new_state()
+		self.edges[start].append((char_class, end))
+		return start, end
+
+	def parse_escape(self):
+		if (c := self.peek()) is None: raise scan_error('trailing \\ in pattern {!r}'.format(self.pattern))
+		self.pos += 1
+		if c in escape_classes: return escape_classes[c]
+		c = escape_chars.get(c, c)
+		return (False, ((c, c),))
+
+	def parse_brackets(self):
+		negated = self.peek() == '^'
+		if negated: self.pos += 1
+		ranges = []
+		while (c := self.peek()) != ']':
+			if c is None: raise scan_error('unclosed [ in pattern {!r}'.format(self.pattern))
+			self.pos += 1
+			if c == '\\':
+				esc = self.parse_escape()
+				if esc[0] or len(esc[1]) > 1 or esc[1][0][0] != esc[1][0][1]:
+					ranges.extend(esc[1]) # \d \w \s inside the brackets
+					continue
+				c = esc[1][0][0]
+			if self.peek() == '-' and self.pos + 1 < len(self.pattern) and self.pattern[self.pos + 1] != ']':
+				self.pos += 1
+				hi = self.pattern[self.pos]
+				self.pos += 1
+				if hi == '\\': hi = self.parse_escape()[1][0][0]
+				ranges.append((c, hi))
+			else:
+				ranges.append((c, c))
+		self.pos += 1
+		return (negated, tuple(ranges))
+
+	def eps_closure(self, states) -> frozenset[int]:
+		closure = set(states)
+		stack = list(states)
+		while stack:
+			for t in self.eps[stack.pop()]:
+				if t not in closure:
+					closure.add(t)
+					stack.append(t)
+		return frozenset(closure)
+
+
+class scanner_dfa:
+	# the subset DFA of nfa restricted to some terminals.
+	# the states are built lazily, so the transitions are cached per character as they are met:
+	# trans[d][ch] -> d', -1 for the dead state
+	def __init__(self, nfa: regex_nfa, terminals):
+		self.nfa = nfa
+		self.terminals = frozenset(terminals)
+		self.ids = dict[frozenset, int]()
+		self.nfa_states = list[frozenset]()
+		self.trans = list[dict[str, int]]()
+		self.accept = list()
+		self.start = self.intern(nfa.eps_closure([nfa.starts[t] for t in self.terminals]))
+
+	def intern(self, states) -> int:
+		if (d := self.ids.get(states)) is not None: return d
+		d = self.ids[states] = len(self.nfa_states)
+		self.nfa_states.append(states)
+		self.trans.append(dict())
+		accepted = [t for q in states if (t := self.nfa.accept[q]) is not None]
+		self.accept.append(min(accepted, key = self.nfa.priority.get) if accepted else None)
+		return d
+
+	def step(self, d, ch) -> int:
+		if (e := self.trans[d].get(ch)) is not None: return e
+		targets = [t for q in self.nfa_states[d] for char_class, t in self.nfa.edges[q] if class_has(char_class, ch)]
+		e = self.trans[d][ch] = self.intern(self.nfa.eps_closure(targets)) if targets else -1
+		return e
+
+	def match(self, text, pos) -> tuple:
+		# the longest lexeme at text[pos:], returns (terminal, end) or (None, pos)
+		d, i = self.start, pos
+		terminal, end = self.accept[d], pos
+		while i < len(text) and (d := self.step(d, text[i])) != -1:
+			i += 1
+			if self.accept[d] is not None: terminal, end = self.accept[d], i
+		return terminal, end
+
+
+class context_scanner:
+	# pda     : a lr1_pda (or slr_pda / parse_service.parse_tables), anything with .action
+	# patterns: terminal -> pattern, the terminals without a pattern are matched by their spelling.
+	#           the spelled terminals win over the patterns when both match the same longest lexeme
+	# skip    : pattern of the layout between the tokens
+	def __init__(self, pda, patterns = None, skip = r'\s+'):
+		self.pda = pda
+		patterns = dict(patterns or {})
+		self.terminals = sorted({x for row in pda.action for x, (category, _) in row.items() if category != action_category.GOTO and not isinstance(x, end_token)})
+		self.terminal_bit = {t: 1 << i for i, t in enumerate(self.terminals)}
+		self.end_bit = 1 << len(self.terminals)
+
+		self.nfa = regex_nfa()
+		for t in self.terminals:
+			if t not in patterns: self.nfa.add_pattern(t, literal(t))
+		for t in self.terminals:
+			if t in patterns: self.nfa.add_pattern(t, patterns[t])
+		self.skip = None
+		if skip:
+			self.nfa.add_pattern(end_token(), skip) # end_token() never is a real terminal, reuse it as the layout
+			self.skip = scanner_dfa(self.nfa, [end_token()])
+
+		# valid[state]: bitset of the acceptable terminals in state, end_bit if the input may end there
+		self.valid = list[int]()
+		for row in pda.action:
+			bits = 0
+			for x, (category, _) in row.items():
+				if category == action_category.GOTO: continue
+				bits |= self.end_bit if isinstance(x, end_token) else self.terminal_bit[x]
+			self.valid.append(bits)
+		self.dfas = dict[int, scanner_dfa]() # bitset -> DFA, many states share the same bitset
+
+	def acceptable(self, state) -> list[str]:
+		bits = self.valid[state]
+		return [t for t in self.terminals if bits & self.terminal_bit[t]]
+
+	def dfa_of(self, state) -> scanner_dfa:
+		bits = self.valid[state] & ~self.end_bit
+		if (dfa := self.dfas.get(bits)) is None:
+			dfa = self.dfas[bits] = scanner_dfa(self.nfa, self.acceptable(state))
+		return dfa
+
+	def skip_layout(self, text, pos) -> int:
+		if self.skip is None: return pos
+		return self.skip.match(text, pos)[1]
+
+	def scan(self, text, pos, state) -> tuple:
+		# the next token in text[pos:] which is acceptable in state:
+		# (terminal, lexeme, start, end), terminal is end_token() at the end of text, None if nothing matches
+		pos = self.skip_layout(text, pos)
+		if pos == len(text):
+			return (end_token() if self.valid[state] & self.end_bit else None), '', pos, pos
+		terminal, end = self.dfa_of(state).match(text, pos)
+		if end == pos: terminal = None # the empty lexeme is never a token
+		return terminal, text[pos:end], pos, end
+
+	def tokens(self, text, entry = None):
+		# parse text, yields (terminal, lexeme, start) and finally the result of slr_pda.test,
+		# the index of the result is the character position in text
+		action = self.pda.action
+		P = self.pda.g.P if hasattr(self.pda, 'g') else None
+		stack = [self.pda.entries[entry] if entry is not None else 0]
+		pos = 0
+		while True:
+			tok, lexeme, start, pos = self.scan(text, pos, stack[-1])
+			if tok is None:
+				yield (False, start)
+				return
+			while True:
+				category, arg = action[stack[-1]][tok]
+				if category == action_category.SHIFT:
+					stack.append(arg)
+					yield (tok, lexeme, start)
+					break
+				elif category == action_category.REDUCE:
+					length = self.pda.lengths[arg] if P is None else (len(P[arg].body) if P[arg].body[0] != 'ε' else 0)
+					head = self.pda.heads[arg] if P is None else P[arg].head
+					if length: del stack[-length:]
+					stack.append(action[stack[-1]][head][1])
+					if tok not in action[stack[-1]]:
+						# LALR(1) may reduce on a lookahead which is an error afterwards
+						yield (False, start)
+						return
+				elif category == action_category.ACCEPT:
+					yield (True, start)
+					return
+				else:
+					yield (False, 'bad teble at position ' + str(start))
+					return
+
+	def parse(self, text, entry = None) -> tuple:
+		# returns (result, tokens), result is the same as slr_pda.test but indexed by the character position
+		toks = list(self.tokens(text, entry))
+		return toks[-1], toks[:-1]
+
+
+if __name__ == '__main__':
+	from grammer_preprocess import loads_grammer, generator, lalr_generator, lr1_pda
+
+	# 'if' and 'then' are keywords at the beginning of a statement, but identifiers on the right side of '='
+	P = loads_grammer('''
+		S : S ';' C | C ;
+		C : if E then C | id '=' E ;
+		E : E '+' F | F ;
+		F : id | num | if | then ;
+	''').P
+	pda = lr1_pda(lalr_generator(generator(P)))
+	scanner = context_scanner(pda, {'id': r'[a-zA-Z_]\w*', 'num': r'\d+'})
+	for i, bits in enumerate(scanner.valid):
+		print(i, scanner.acceptable(i), '$' if bits & scanner.end_bit else '')
+	for text in ('if x then y = 1', 'x = if + then; if x then y = then', 'x = 1 +', 'iffy = if'):
+		print(repr(text), scanner.parse(text))
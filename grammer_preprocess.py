@@ -23,10 +23,15 @@ grammer-preprocess.py
 '''
 
 
-import regex as re
-import queue as que
 from copy import copy
 from enum import Enum, auto
+from array import array
+from collections import OrderedDict
+from types import MappingProxyType
+from threading import Lock
+import pickle
+import sqlite3
+from time import perf_counter_ns
 
 class end_token:
 	def __eq__(self, other):
@@ -42,8 +47,8 @@ class end_token:
 
 
 class production: # grammer production type(BNF)
-	head = str()
-	body = list[str]()
+	head: str
+	body: list[str]
 	def __init__(self, head_: str, body_: list[str]):
 		self.head = head_
 		self.body = body_
@@ -57,11 +62,50 @@ class production: # grammer production type(BNF)
 	def __ne__(self, other):
 		return not self == other
 	def __hash__(self):
-		return hash([self.head].extend(self.body))
+		return hash((self.head, tuple(self.body)))
 
 	def __copy__(self):
 		return production(self.head, self.body.copy())
+
+	def key(self):
+		# an immutable identity of the production, used to diff production lists
+		return (self.head, tuple(self.body))
 		
+def strongly_connected_components(nodes, successors) -> list[set]:
+	# Tarjan's algorithm (iterative), the components are returned dependencies-first:
+	# if u -> v (u depends on v) and they are in different components, v's component comes before u's one
+	index, low, stack, on_stack = dict(), dict(), list(), set()
+	result = list[set]()
+	for root in nodes:
+		if root in index: continue
+		work = [(root, iter(successors(root)))]
+		index[root] = low[root] = len(index)
+		stack.append(root)
+		on_stack.add(root)
+		while work:
+			v, it = work[-1]
+			for w in it:
+				if w not in index:
+					index[w] = low[w] = len(index)
+					stack.append(w)
+					on_stack.add(w)
+					work.append((w, iter(successors(w))))
+					break
+				elif w in on_stack:
+					low[v] = min(low[v], index[w])
+			else:
+				work.pop()
+				if work: low[work[-1][0]] = min(low[work[-1][0]], low[v])
+				if low[v] == index[v]:
+					component = set()
+					while True:
+						w = stack.pop()
+						on_stack.discard(w)
+						component.add(w)
+						if w == v: break
+					result.append(component)
+	return result
+
 def print_dictset(dictset: dict[str, set[str]]):
 	for k, v in dictset.items():
 		print('{: <5} : {}'.format(k, ', '.join(v)))
@@ -92,46 +136,339 @@ def print_all(gen):
 	for i, s in enumerate(gen.select): print('{: <3} {:<20} : {}'.format(str(i) + '.', str(gen.g.P[i]), ' '.join(s)))
 
 class grammer:
-	V = set[str]() # a grammer Variable set, each of a variable is a string.
-	T = set[str]() # a grammer Terminal set, each of a terminal is a string.
-	P = list[production]() # a grammer Principle set, contain objects of bnf
-	S = str()    # Start Variable of the grammer
-
-	def __init__(self, V = set(), T = set(), P = list(), S = str()):
-		self.V = V
-		self.T = T
-		self.P = P
+	V: set[str]           # a grammer Variable set, each of a variable is a string.
+	T: set[str]           # a grammer Terminal set, each of a terminal is a string.
+	P: list[production]   # a grammer Principle set, contain objects of bnf
+	S: str                # Start Variable of the grammer
+	version = 0  # increased each time P is edited, the cached analyses of an older version are invalid
+
+	def __init__(self, V = None, T = None, P = None, S = str()):
+		self.V = V if V is not None else set()
+		self.T = T if T is not None else set()
+		self.P = P if P is not None else list()
 		self.S = S
 
 	def __copy__(self):
-		return grammer(self.V.copy(), self.T.copy(), self.P.copy(), self.S.copy())
+		return grammer(self.V.copy(), self.T.copy(), self.P.copy(), self.S)
+
+	def snapshot(self):
+		# shares V, T and P with self, the version is kept so that the cached analyses stay valid
+		g = grammer(self.V, self.T, self.P, self.S)
+		g.version = self.version
+		return g
+
+	def frozen(self):
+		# an immutable snapshot, for the finished automata which may be shared between threads
+		return grammer(frozenset(self.V), frozenset(self.T), tuple(self.P), self.S)
 
 def lex(s: str) -> list[production]:
 	# bnf string ' A -> V1 op V2 num; '
+	import regex as re
 
 	# separator is blank or some non-assosiated tokens
 	result = list[production]()
 
-	last_v = str()
-	for p in s.strip(' \n\t\v\f\r').split('\n'):
+	last_v = None
+	for lineno, p in enumerate(s.strip(' \n\t\v\f\r').split('\n'), 1):
 		# print(p)
 		if (p := p.strip(' \n\t\v\f\r')) == '': continue # skip empty line
 
 		v = re.search(r"(?=\s*)\w+\'*(?=\s*\-\>.*)", p)
+		if v == None and last_v == None:
+			raise grammer_error('a production without head', (None, lineno, 1, p))
 		body = re.findall(r"\w+\'*|[^\s\w]", p[v.span()[1]:] if v != None else p)[2:]
 		result.append(production(v.group() if v != None else last_v.group(), body if len(body) != 0 else ['ε']))
 		if v != None: last_v = v 
 	return result
 
+
+class grammer_error(SyntaxError):
+	pass
+
+# a grammer file, in a yacc-like syntax:
+#
+#	%token id literal         declares terminals, if there is any %token, all of the terminals must be declared
+#	%left '+' '-'             precedence declarations, from low to high: %left, %right, %nonassoc
+#	%start S                  the start variable, the head of the first rule by default
+#	%%
+#	S    : DeclList Expr ;
+#	Expr : Expr '+' Expr
+#	     | '-' Expr %prec NEG
+#	     | %empty            an empty alternative, same as nothing between two '|'
+#	     ;
+#	%%
+#
+# '->' can be used instead of ':', the ';' at the end of a rule is optional, 
+# and so is the first '%%' if there are no declarations.
+# quoted symbols are terminals, comments are /* ... */ and // ..., actions { ... } are skipped.
+class grammer_spec:
+	def __init__(self):
+		self.P = list[production]()
+		self.S = None
+		self.tokens = set[str]()                          # declared terminals
+		self.precedence = dict[str, tuple[int, str]]()    # terminal -> (level, 'left' | 'right' | 'nonassoc')
+		self.production_precedence = dict[int, str]()     # index of production -> terminal of %prec
+
+def scan_grammer(lines, filename = None):
+	# yields (kind, value, lineno, col, line), kind: 'id', 'literal', ':', '|', ';', '%%', '%...' directives
+	in_comment = False
+	action_depth = 0
+	for lineno, line in enumerate(lines, 1):
+		i, n = 0, len(line)
+		while i < n:
+			c = line[i]
+			if in_comment:
+				if (j := line.find('*/', i)) == -1: break
+				in_comment, i = False, j + 2
+			elif action_depth:
+				if c == '{': action_depth += 1
+				elif c == '}': action_depth -= 1
+				i += 1
+			elif c.isspace():
+				i += 1
+			elif line.startswith('/*', i):
+				in_comment, i = True, i + 2
+			elif line.startswith('//', i):
+				break
+			elif c == '{':
+				action_depth, i = 1, i + 1
+			elif c.isalnum() or c == '_':
+				j = i
+				while j < n and (line[j].isalnum() or line[j] in "_'"): j += 1
+				yield ('id', line[i:j], lineno, i + 1, line)
+				i = j
+			elif c in '\'"':
+				if (j := line.find(c, i + 1)) == -1 or j == i + 1:
+					raise grammer_error('bad quoted symbol', (filename, lineno, i + 1, line))
+				yield ('literal', line[i+1:j], lineno, i + 1, line)
+				i = j + 1
+			elif line.startswith('%%', i):
+				yield ('%%', '%%', lineno, i + 1, line)
+				i += 2
+			elif c == '%':
+				j = i + 1
+				while j < n and (line[j].isalnum() or line[j] == '_'): j += 1
+				yield (line[i:j], line[i:j], lineno, i + 1, line)
+				i = j
+			elif line.startswith('->', i):
+				yield (':', '->', lineno, i + 1, line)
+				i += 2
+			elif c in ':|;':
+				yield (c, c, lineno, i + 1, line)
+				i += 1
+			else:
+				# a bare punctuation is a terminal
+				yield ('literal', c, lineno, i + 1, line)
+				i += 1
+	if in_comment or action_depth:
+		raise grammer_error('unterminated ' + ('comment' if in_comment else 'action'), (filename, lineno, 1, line))
+
+def load_grammer(f, filename = None) -> grammer_spec:
+	# f: a path, a file object or any iterable of lines
+	if isinstance(f, str):
+		with open(f, encoding = 'utf-8') as file:
+			return load_grammer(file, f)
+
+	spec = grammer_spec()
+	symbols = dict[str, str]()
+	intern = lambda x: symbols.setdefault(x, x)
+	heads = dict[str, int]()    # variable -> line of its first rule
+	used = dict[str, tuple]()   # identifier in bodys -> where it is used first
+	error = lambda msg, tok: grammer_error(msg, (filename, tok[2], tok[3], tok[4]))
+
+	toks = scan_grammer(f, filename)
+	back = [] # pushed back tokens
+	next_tok = lambda: back.pop() if back else next(toks, None)
+
+	section = 0 # 0: declarations, 1: rules, 2: epilogue
+	directive, level = None, 0
+	head, body, prec = None, None, None # body is None between rules
+
+	def end_alternative():
+		if body is None: return
+		if prec is not None: spec.production_precedence[len(spec.P)] = prec
+		spec.P.append(production(head, body if body else ['ε']))
+
+	while (tok := next_tok()) is not None:
+		kind, value = tok[0], tok[1]
+		if kind == '%%':
+			if (section := section + 1) == 2: break
+			continue
+
+		if section == 0 and directive is None and kind[0] != '%':
+			section = 1 # no declarations, the grammer begins with the rules
+		if section == 0:
+			if kind in ('%token', '%left', '%right', '%nonassoc', '%start'):
+				directive = kind
+				if kind not in ('%token', '%start'): level += 1
+			elif kind in ('id', 'literal') and directive is not None:
+				x = intern(value)
+				if directive == '%start': 
+					spec.S = x
+				else:
+					spec.tokens.add(x)
+					if directive != '%token': spec.precedence[x] = (level, directive[1:])
+			else:
+				raise error('unexpected {} in declarations'.format(value), tok)
+			continue
+
+		if kind == 'id':
+			if (nxt := next_tok()) is not None and nxt[0] == ':':
+				# a new rule
+				end_alternative()
+				head, body, prec = intern(value), [], None
+				heads.setdefault(head, tok[2])
+				continue
+			if nxt is not None: back.append(nxt)
+			if body is None: raise error('expected \':\' after ' + value, nxt or tok)
+			body.append(intern(value))
+			used.setdefault(value, tok)
+		elif kind == 'literal':
+			if body is None: raise error('a rule must begin with a variable', tok)
+			body.append(intern(value))
+		elif kind == '|':
+			if head is None: raise error('\'|\' before any rule', tok)
+			end_alternative()
+			body, prec = [], None
+		elif kind == ';':
+			if body is None: raise error('\';\' without a rule', tok)
+			end_alternative()
+			body, prec = None, None
+		elif kind == '%prec':
+			if body is None: raise error('%prec without a rule', tok)
+			if (nxt := next_tok()) is None or nxt[0] not in ('id', 'literal'):
+				raise error('expected a terminal after %prec', nxt or tok)
+			prec = intern(nxt[1])
+		elif kind == '%empty':
+			if body is None: raise error('%empty without a rule', tok)
+		else:
+			raise error('unexpected ' + value, tok)
+	end_alternative()
+
+	if not spec.P: 
+		raise grammer_error('no rules', (filename, 1, 1, ''))
+	if spec.S is None: 
+		spec.S = spec.P[0].head
+	elif spec.S not in heads: 
+		raise grammer_error('the start variable {} has no rules'.format(spec.S), (filename, 1, 1, ''))
+	for x in spec.tokens & heads.keys():
+		raise grammer_error('token {} has rules'.format(x), (filename, heads[x], 1, ''))
+	if spec.tokens:
+		for x, tok in used.items():
+			if x not in heads and x not in spec.tokens:
+				raise error('{} is used, but is not declared as a token and has no rules'.format(x), tok)
+	if spec.P[0].head != spec.S:
+		# the generators take the head of the first production as the start variable,
+		# the %prec of the productions move with them
+		order = sorted(range(len(spec.P)), key = lambda i: spec.P[i].head != spec.S)
+		spec.P = [spec.P[i] for i in order]
+		spec.production_precedence = {k: spec.production_precedence[i] for k, i in enumerate(order) if i in spec.production_precedence}
+	return spec
+
+def loads_grammer(s: str) -> grammer_spec:
+	return load_grammer(s.splitlines())
+
+class production_store:
+	# productions indexed by head and deduplicated by hash, 
+	# productions of the same head are kept together, in the order of insertion
+	def __init__(self, P: list[production] = None):
+		self.by_head = dict[str, dict[tuple, production]]()
+		for p in P or []: self.add(p)
+
+	def add(self, p: production) -> bool:
+		# returns False if p is already in the store
+		bodys = self.by_head.setdefault(p.head, dict())
+		if (body := tuple(p.body)) in bodys: return False
+		bodys[body] = p
+		return True
+
+	def of(self, head: str) -> list[production]:
+		return list(self.by_head.get(head, dict()).values())
+
+	def heads(self) -> list[str]:
+		return [v for v, bodys in self.by_head.items() if bodys]
+
+	def productions(self) -> list[production]:
+		return [p for bodys in self.by_head.values() for p in bodys.values()]
+
+	def __iter__(self):
+		return iter(self.productions())
+
 class generator:
-	g = grammer()
-	nullable = dict[str, bool]()
-	first    = dict[str, set[str]]()
-	follow   = dict[str, set[str]]()
-	select   = list[set[str]]()
+	g: grammer
+
+	# nullable, first, follow and select are computed lazily and cached, 
+	# each of them is tagged with the grammer version it was computed from:
+	#   cache['nullable'], cache['first'] -> cached_version['first']
+	#   cache['follow']                   -> cached_version['follow']
+	#   cache['select']                   -> cached_version['select']
+	cache = None
+	cached_version = None
+
+	# analysed[level]: (keys of g.P, S, cache) when the level was analysed last, try_update_delta() diffs against them
+	analysed = None
+
+	backend = 'set' # 'set': iterate over the productions with python sets, 'matrix': boolean matrices with numpy
+
+	@property
+	def nullable(self) -> dict[str, bool]:
+		self.analyse('first')
+		return self.cache['nullable']
+
+	@property
+	def first(self) -> dict[str, set[str]]:
+		self.analyse('first')
+		return self.cache['first']
+
+	@property
+	def follow(self) -> dict[str, set[str]]:
+		self.analyse('follow')
+		return self.cache['follow']
+
+	@property
+	def select(self) -> list[set[str]]:
+		self.analyse('select')
+		return self.cache['select']
+
+	def analyse(self, level: str):
+		# bring the analysis level ('first', 'follow' or 'select') up to date with the grammer version,
+		# the levels below it first, the levels above it are left until they are asked for
+		if self.cached_version.get(level) == self.g.version: return
+		if level == 'follow': self.analyse('first')
+		elif level == 'select': self.analyse('follow')
+		if self.try_update_delta(level): return
+		if level == 'first':
+			if self.backend == 'matrix': self.generate_first_matrix(self.g.P)
+			else: self.generate_first(self.g.P)
+		elif level == 'follow':
+			if self.backend == 'matrix': self.generate_follow_matrix(self.g.P, self.g.S)
+			else: self.generate_follow(self.g.P, self.g.S)
+		else:
+			self.generate_select(self.g.P)
+
+	def try_update_delta(self, level: str) -> bool:
+		# update the sets of level from its last analysis if only a few productions changed,
+		# the levels below it are up to date
+		if (base := self.analysed.get(level)) is None: return False
+		keys = {p.key() for p in self.g.P}
+		old_keys = set(base[0])
+		added   = [production(h, list(b)) for h, b in keys - old_keys]
+		removed = [production(h, list(b)) for h, b in old_keys - keys]
+		if len(added) + len(removed) > len(keys) // 2: return False
+		if level == 'first': return self.update_first_delta(base, added, removed)
+		if level == 'follow': return self.update_follow_delta(base, added, removed)
+		return self.update_select_delta(base, added, removed)
 
 	def __copy__(self):
-		return generator(self.g.P.copy(), self.g.S)
+		# a copy-on-write snapshot: the productions and the cached analyses are shared with self,
+		# neither side modifies them in place, an edit of g.P assigns a new list and the analyses are
+		# updated into new dicts, so the other side is not affected
+		child = generator(None, backend = self.backend)
+		child.g = self.g.snapshot()
+		child.cache = dict(self.cache)
+		child.cached_version = dict(self.cached_version)
+		child.analysed = dict(self.analysed)
+		return child
 
 	def generate_first(self, P: set[production]):
 		V = {v.head for v in P} # variable set
@@ -181,8 +518,10 @@ class generator:
 		self.g.V = V
 		self.g.T = T
 		self.g.P = P
-		self.nullable = nullable
-		self.first = first
+		self.cache['nullable'] = nullable
+		self.cache['first'] = first
+		self.cached_version['first'] = self.g.version
+		self.record_analysis('first')
 
 	def generate_follow(self, P: list[production], S: str):
 		follow = {v: set() for v in self.g.V}
@@ -210,8 +549,101 @@ class generator:
 
 			if not changed: break
 		self.g.S = S
-		self.follow = follow
+		self.cache['follow'] = follow
+		self.cached_version['follow'] = self.g.version
+		self.record_analysis('follow')
+
+
+	# boolean matrix backend:
+	# the symbols are numbered, variables first, and the relations between them are boolean matrices:
+	#   A begins-with X:   A -> α X β, α =>* ε
+	#   B followed-by X:   A -> α B β X γ, β =>* ε
+	#   B inherits A:      A -> α B β, β =>* ε   (follow(A) ⊆ follow(B))
+	# first and follow are the products of the reflexive transitive closures of them and the terminal columns 
+
+	@staticmethod
+	def transitive_closure(R):
+		# reflexive transitive closure of a square boolean matrix, by Warshall's algorithm
+		import numpy as np
+		R = R | np.eye(len(R), dtype = bool)
+		for k in range(len(R)):
+			R |= np.outer(R[:, k], R[k, :])
+		return R
+
+	def generate_first_matrix(self, P: list[production]):
+		import numpy as np
+		V = {v.head for v in P} # variable set
+		T = {x for p in P for x in p.body if x not in V and x != 'ε'} | {'$'} # terminal set
+		Vs, Ts = list(V), list(T)
+		vi = {v: i for i, v in enumerate(Vs)}
+		ti = {t: i for i, t in enumerate(Ts)}
+
+		# nullable: a production is nullable when all of its variables are nullable
+		nullable_v = np.zeros(len(Vs), dtype = bool)
+		while True:
+			changed = False
+			for p in P:
+				if nullable_v[vi[p.head]]: continue
+				if p.body[0] == 'ε' or all(x in vi and nullable_v[vi[x]] for x in p.body):
+					nullable_v[vi[p.head]] = changed = True
+			if not changed: break
 
+		begins_v = np.zeros((len(Vs), len(Vs)), dtype = bool)
+		begins_t = np.zeros((len(Vs), len(Ts)), dtype = bool)
+		for p in P:
+			if p.body[0] == 'ε': continue
+			for x in p.body:
+				if x in vi:
+					begins_v[vi[p.head], vi[x]] = True
+					if not nullable_v[vi[x]]: break
+				else:
+					begins_t[vi[p.head], ti[x]] = True
+					break
+
+		first_t = self.transitive_closure(begins_v) @ begins_t
+		first = {v: {Ts[j] for j in np.flatnonzero(first_t[i])} | ({'ε'} if nullable_v[i] else set()) for i, v in enumerate(Vs)}
+		first |= {t: {t} for t in Ts}
+		nullable = {v: bool(nullable_v[i]) for i, v in enumerate(Vs)} | {t: False for t in Ts}
+
+		self.g.V = V
+		self.g.T = T
+		self.g.P = P
+		self.cache['nullable'] = nullable
+		self.cache['first'] = first
+		self.cached_version['first'] = self.g.version
+		self.record_analysis('first')
+
+	def generate_follow_matrix(self, P: list[production], S: str):
+		import numpy as np
+		nullable, first = self.nullable, self.first
+		Vs, Ts = list(self.g.V), list(self.g.T)
+		vi = {v: i for i, v in enumerate(Vs)}
+		ti = {t: i for i, t in enumerate(Ts)}
+
+		first_t = np.zeros((len(Vs), len(Ts)), dtype = bool)
+		for v, i in vi.items():
+			for t in first[v] - {'ε'}: first_t[i, ti[t]] = True
+
+		followed_v = np.zeros((len(Vs), len(Vs)), dtype = bool)
+		followed_t = np.zeros((len(Vs), len(Ts)), dtype = bool)
+		inherits   = np.zeros((len(Vs), len(Vs)), dtype = bool)
+		followed_t[vi[S], ti['$']] = True
+		for p in P:
+			if p.body[0] == 'ε': continue
+			for i, tok in enumerate(p.body):
+				if tok not in vi: continue
+				for x in p.body[i+1:]:
+					if x in vi: followed_v[vi[tok], vi[x]] = True
+					else: followed_t[vi[tok], ti[x]] = True
+					if not nullable[x]: break
+				else:
+					inherits[vi[tok], vi[p.head]] = True
+
+		follow_t = self.transitive_closure(inherits) @ (followed_t | followed_v @ first_t)
+		self.g.S = S
+		self.cache['follow'] = {v: {Ts[j] for j in np.flatnonzero(follow_t[i])} for i, v in enumerate(Vs)}
+		self.cached_version['follow'] = self.g.version
+		self.record_analysis('follow')
 
 	def first_of_seq(self, seq: list[str]) -> set[str]:
 		# generate the first set of a sequence seq
@@ -235,12 +667,20 @@ class generator:
 	def nullable_of_seq(self, seq: list[str]) -> bool:
 		return (len(seq) == 1 and seq[0] == 'ε') or sum([self.nullable[tok] for tok in seq]) == len(seq) # all of the tokens are nullable
 
+	def select_of(self, p: production) -> set[str]:
+		first_of_body = self.first_of_seq(p.body)
+		return (first_of_body - {'ε'}) | self.follow[p.head] if 'ε' in first_of_body else first_of_body
+
 	def generate_select(self, P):
-		select = list[set[str]]()
-		for p in P:
-			first_of_body = self.first_of_seq(p.body)
-			select.append((first_of_body - {'ε'}) | self.follow[p.head] if 'ε' in first_of_body else first_of_body)
-		self.select = select
+		self.cache['select'] = [self.select_of(p) for p in P]
+		self.cached_version['select'] = self.g.version
+		self.record_analysis('select')
+
+	def record_analysis(self, level: str):
+		# remember the productions which the sets of level are computed from,
+		# try_update_delta() diffs against them to update the sets incrementally.
+		# the sets are never modified in place, so a shallow copy of the cache keeps them
+		self.analysed[level] = ([p.key() for p in self.g.P], self.g.S, dict(self.cache))
 
 	def find_empty_expression_of(self, v):
 		for i, p in enumerate(self.g.P):
@@ -250,80 +690,87 @@ class generator:
 		return -1
 
 
-	def add_non_empty_expression(self, v: str, p: production):
-		
-		q = que.SimpleQueue()
-		q.put(p.body)
-		while not q.empty():
-			this_body = q.get()
-			if len(this_body) == 1 and this_body[0] == v:
-				continue # V -> αAβ, αβ = ε
-
-			for i, tok in enumerate(this_body):
-				if tok == v:
-					(new_body := this_body.copy()).pop(i)
-					new_p = production(p.head, new_body)
-					if self.g.P.count(new_p) == 0:
-						self.g.P.append(new_p)
-						if new_body.count(v) != 0:
-							q.put(new_body)
+	def add_non_empty_expression(self, p: production, store, erasable):
+		# add p and all of the productions which erase some occurrences of the erasable variables of p.body into store,
+		# except of the empty ones (V -> αAβ, αβ = ε)
+		bodys = {()}
+		for tok in p.body:
+			bodys = {b + (tok, ) for b in bodys} | (bodys if tok in erasable else set())
+		for body in bodys:
+			if body: store.add(production(p.head, list(body)))
 
 		
-	def remove_empty_productions(self):
+	def binarize(self, nullable_only = False):
+		# A -> X1 X2 ... Xn (n > 2)   ==>   A -> X1 A'1, A'1 -> X2 A'2, ..., A'(n-2) -> X(n-1) Xn
+		# the suffix variables are shared by the bodys of the same suffix,
+		# nullable_only: keep the bodys which have no nullable symbols as they are
+		suffixes = dict[tuple, str]()
+		store = production_store()
+		used = set(self.g.V)
+
+		def suffix_variable(head, suffix):
+			if (v := suffixes.get(suffix)) is None:
+				k = 1
+				while (v := head + '\'' + str(k)) in used: k += 1
+				used.add(v)
+				suffixes[suffix] = v
+				store.add(production(v, [suffix[0], suffix_variable(head, suffix[1:]) if len(suffix) > 2 else suffix[1]]))
+			return v
+
+		for p in self.g.P:
+			if len(p.body) <= 2 or (nullable_only and not any(self.nullable.get(x, False) for x in p.body)):
+				store.add(p)
+				continue
+			# the head is added before its suffix variables, so the first production stays the start one
+			store.by_head.setdefault(p.head, dict())
+			store.add(production(p.head, [p.body[0], suffix_variable(p.head, tuple(p.body[1:]))]))
+
+		self.g.P = store.productions()
+		self.update_sets()
+
+	def remove_empty_productions(self, binarize = False, binarize_all = True):
 		# remove all of the productions that A -> ε, except of the start variable S if S is nullable
+		# binarize: binarize the bodys first, so that a body erases to at most 3 productions instead of 2^k,
+		#           binarize_all = False skips the bodys without nullable symbols
 		if self.nullable[self.g.S]:
 			new_s = self.g.S + '\''
 			(P := [production(new_s, [self.g.S]), production(new_s, ['ε'])]).extend(self.g.P)
-			# re-generate the grammer g
-			self.generate_first(P)          # generate nullable, first and g(except of g.S)
-			self.generate_follow(P, new_s)  # generate follow
-			self.generate_select(P)         # generate select
+			# re-generate the grammer g, the sets are updated on demand
+			self.g.P = P
+			self.update_sets()
 
-		for v in self.g.V:
-			if not self.nullable[v] or v == self.g.S: continue
-			if (i := self.find_empty_expression_of(v)) != -1:
-				self.g.P.pop(i)
-			
-			for p in self.g.P:
-				# why?
-				# if not self.nullable[p.head] or 
-				if p.body.count(v) == 0: continue
-				self.add_non_empty_expression(v, p)
-
-		self.update_sets()
+		if binarize: self.binarize(nullable_only = not binarize_all)
 
-	def flatten_single_productions(self, root_variable, unflattened_variables, current_new_productions):
-		# returns non_single_bodys
-
-		# new_productions = []
-		# (q := que.SimpleQueue()).put(root_variable)
-		unflattened_variables.discard(root_variable)
-		# non_single_bodys = set()
-		for root_candidate in [p for p in self.g.P if p.head == root_variable]:
-			if not (len(root_candidate.body) == 1 and root_candidate.body[0] in self.g.V):
-				# not a single production
-				current_new_productions.append(root_candidate)
-
-			else:
-				# is a single production
-				if root_candidate.body[0] in unflattened_variables:
-					self.flatten_single_productions(root_candidate.body[0], unflattened_variables, current_new_productions)
-					# current_new_productions.extend([production(root_variable, p.body) for p in current_new_productions if p.head == root_candidate.body[0]])
-				# else:
-					# v := root_candidate.body[0] has been flattened
-				current_new_productions.extend([production(root_variable, p.body) for p in current_new_productions if p.head == root_candidate.body[0]])
+		erasable = {v for v in self.g.V if self.nullable[v] and v != self.g.S}
+		store = production_store()
+		for p in self.g.P:
+			if p.body[0] == 'ε':
+				if p.head == self.g.S: store.add(p)
+				continue
+			self.add_non_empty_expression(p, store, erasable)
 
+		self.g.P = store.productions()
+		self.update_sets()
 
 	def remove_single_productions(self):
-		# if root_variable is None: root_variable = self.g.S
-		new_productions = []
-		unflattened_variables = self.g.V.copy()
-
-		self.flatten_single_productions(self.g.S, unflattened_variables, new_productions)
-		while unflattened_variables:
-			self.flatten_single_productions(unflattened_variables.pop(), unflattened_variables, new_productions)
+		# A -> B -> ... -> X -> α   ==>   A -> α, where α is not a single variable
+		store = production_store(self.g.P)
+		new_store = production_store()
+
+		for v in [self.g.S] + [v for v in store.heads() if v != self.g.S]:
+			# variables reachable from v by single productions, v itself included
+			reachable = [v]
+			seen = {v}
+			for u in reachable:
+				for p in store.of(u):
+					if len(p.body) == 1 and p.body[0] in self.g.V:
+						if p.body[0] not in seen:
+							seen.add(p.body[0])
+							reachable.append(p.body[0])
+					else:
+						new_store.add(production(v, p.body) if u != v else p)
 
-		self.g.P = new_productions
+		self.g.P = new_store.productions()
 		self.update_sets()
 
 	def remove_direct_left_recursion(self, v: str, P: list[production], allow_empty_production): 
@@ -366,7 +813,8 @@ class generator:
 		return new_productions
 
 	def remove_left_recursion(self, allow_empty_production = False, by_order = False):
-		new_productions = []
+		store = production_store(self.g.P)
+		new_store = production_store()
 		replaced_variables = set()
 
 		print('allowed empty production.' if allow_empty_production else 'not allow empty production.')
@@ -378,22 +826,101 @@ class generator:
 			# print('--')
 			direct_v_candidates = []
 
-			for v_candidate in [p for p in self.g.P if p.head == v]:
+			for v_candidate in store.of(v):
 				if v_candidate.body[0] in replaced_variables:
-					candidates_of_body_first = [p for p in new_productions if p.head == v_candidate.body[0]]
 					# replace productions
-					direct_v_candidates.extend([production(v, p.body + v_candidate.body[1:]) for p in candidates_of_body_first])
+					direct_v_candidates.extend([production(v, p.body + v_candidate.body[1:]) for p in new_store.of(v_candidate.body[0])])
 				else:
 					direct_v_candidates.append(v_candidate)
 
 			replaced_variables.add(v)
-			new_productions.extend(self.remove_direct_left_recursion(v, direct_v_candidates, allow_empty_production))
+			for p in self.remove_direct_left_recursion(v, direct_v_candidates, allow_empty_production):
+				new_store.add(p)
 
 		print()
-		self.g.P = new_productions
+		self.g.P = new_store.productions()
 		# print_productions(self.g.P)
 		self.update_sets()
 
+	def remove_useless_symbols(self):
+		# remove the unproductive variables (which derive no terminal string) and then the unreachable ones, 
+		# and all of the productions that contain them
+		store = production_store(self.g.P)
+
+		# unproductive: a production becomes productive when all of its variables are productive
+		pending = dict()  # pending[p.key()]: the number of not yet productive variable occurrences of p
+		waiting = {v: [] for v in self.g.V} # waiting[v]: the productions that contain v
+		productive = set()
+		q = []
+		for p in store:
+			pending[p.key()] = 0
+			for x in p.body:
+				if x in self.g.V:
+					pending[p.key()] += 1
+					waiting[x].append(p)
+			if pending[p.key()] == 0: q.append(p.head)
+		while q:
+			if (v := q.pop()) in productive: continue
+			productive.add(v)
+			for p in waiting[v]:
+				pending[p.key()] -= 1
+				if pending[p.key()] == 0 and p.head not in productive: q.append(p.head)
+
+		if self.g.S not in productive:
+			print('the language of G is empty.')
+			return
+
+		# unreachable
+		reachable = {self.g.S}
+		q = [self.g.S]
+		while q:
+			for p in store.of(q.pop()):
+				if pending[p.key()] != 0: continue
+				for x in p.body:
+					if x in self.g.V and x not in reachable:
+						reachable.add(x)
+						q.append(x)
+
+		self.g.P = [p for p in store if p.head in reachable and pending[p.key()] == 0]
+		self.update_sets()
+
+	def merge_equivalent_variables(self, count_states = True) -> dict[str, str]:
+		# merge the variables whose production sets are the same up to renaming,
+		# e.g. the tails X' -> , Y X' | ε made by remove_direct_left_recursion for X and Z' -> , Y Z' | ε for Z.
+		# returns {merged variable: the variable it is merged into},
+		# count_states: also report the LR(0) states before and after, the automata are only built as packed kernels
+		#
+		# partition refinement: start with all of the variables in one block, split a block when the productions
+		# of its variables differ after the variables of their bodies are replaced by their blocks, until stable
+		store = production_store(self.g.P)
+		order = list(store.heads())
+		block = {v: 0 for v in order}
+		while True:
+			# terminals are wrapped in a tuple so that they never equal a block number
+			signature = lambda v: (block[v], frozenset(tuple(block[x] if x in block else (x,) for x in p.body) for p in store.of(v)))
+			ids = dict()
+			refined = {v: ids.setdefault(signature(v), len(ids)) for v in order}
+			if len(ids) == len(set(block.values())): break
+			block = refined
+
+		representative = dict()
+		for v in order:
+			representative.setdefault(block[v], v)
+		if self.g.S in block: representative[block[self.g.S]] = self.g.S
+		merged = {v: representative[block[v]] for v in order if representative[block[v]] != v}
+		if not merged: return merged
+
+		states_before = len(slr_generator(self).states) if count_states else None
+		rename = lambda x: merged.get(x, x)
+		self.g.P = list({p.key(): p for p in (production(p.head, [rename(x) for x in p.body]) for p in self.g.P if p.head not in merged)}.values())
+		self.update_sets()
+
+		print('merged {} equivalent variables: {}'.format(len(merged), ', '.join('{} -> {}'.format(v, r) for v, r in merged.items())))
+		print('saved {} goto columns'.format(len(merged)), end = '')
+		if count_states: print(', LR(0) states: {} -> {}'.format(states_before, len(slr_generator(self).states)), end = '')
+		print()
+		return merged
+
 	def check_ll1(self):
 		# check if g is a LL(1) grammer
 		# Grammer G is LL(1)'s iff ∀ (A -> α | β) ∈ G, 
@@ -429,50 +956,254 @@ class generator:
 
 
 	def from_production(self, P: set[production], S: str):
-		self.generate_first(P)      # generate nullable, first and g(except of g.S)
-		self.generate_follow(P, S)  # generate follow
-		self.generate_select(P)     # generate select
+		# nullable, first, follow and select are generated on demand
+		self.g = grammer(set(), set(), P, S)
+		self.invalidate()
 		# self.remove_empty_productions()
 
+	def invalidate(self):
+		# g.P has been edited: refresh V and T, and invalidate the cached analyses of the older versions
+		self.g.V = {p.head for p in self.g.P}
+		self.g.T = {x for p in self.g.P for x in p.body if x not in self.g.V and x != 'ε'} | {'$'}
+		self.g.version += 1
+
 	def update_sets(self):
-		self.generate_first(self.g.P)
-		self.generate_follow(self.g.P, self.g.P[0].head)
-		self.generate_select(self.g.P)
+		# the start variable is the head of the first production
+		self.g.S = self.g.P[0].head
+		self.invalidate()
+
+	def apply_delta(self, added: list[production], removed: list[production]):
+		# edit g.P, nullable, first, follow and select are updated incrementally when they are asked for
+		P = list(self.g.P) # g.P may be shared with a snapshot, don't modify it in place
+		for p in removed:
+			P.remove(p)
+		self.g.P = P + added
+		self.invalidate()
+
+	def solve_first(self, variables, by_head, nullable, first):
+		# the fixed point of nullable and first of variables, the sets of other symbols are treated as final
+		while True:
+			changed = False
+			for v in variables:
+				for p in by_head[v]:
+					if p.body[0] == 'ε':
+						if not nullable[v] or 'ε' not in first[v]:
+							nullable[v] = True
+							first[v].add('ε')
+							changed = True
+						continue
 
+					all_nullable = True
+					for x in p.body:
+						if not first[v].issuperset(first[x] - {'ε'}):
+							first[v] |= first[x] - {'ε'}
+							changed = True
+						if not nullable[x]:
+							all_nullable = False
+							break
+					if all_nullable and not nullable[v]:
+						first[v].add('ε')
+						nullable[v] = True
+						changed = True
+			if not changed: break
 
-	def remove_verbose_producions_and_sort(self):
-		q = que.SimpleQueue()
-		order = [self.g.S]
-		q.put(self.g.S)
-		while not q.empty():
-			v = q.get()
-			for v_candidate in [p for p in self.g.P if p.head == v]:
-				for tok in v_candidate.body:
-					if tok in self.g.V and tok not in order:
-						order.append(tok)
-						q.put(tok)
+	def solve_follow(self, variables, occurs, follow):
+		# the fixed point of follow of variables, the follow sets of other variables are treated as final
+		while True:
+			changed = False
+			for v in variables:
+				for p, i in occurs[v]:
+					f = self.first_of_seq(p.body[i+1:])
+					new_follow_toks = (f - {'ε'}) | follow[p.head] if 'ε' in f else f
+					if not new_follow_toks.issubset(follow[v]):
+						follow[v] |= new_follow_toks
+						changed = True
+			if not changed: break
+
+	# update_first_delta, update_follow_delta and update_select_delta update the sets of one level after g.P
+	# has been edited: base is the last analysis of that level, added productions are in g.P and removed ones are not.
+	#
+	# the sets only grow when productions are added, so the affected entries are just propagated
+	# along the dependency graph. 
+	# a removal can shrink the sets, so the strongly connected components which may lose 
+	# some symbols are reset and recomputed from scratch, in dependencies-first order.
+	# the start variable may change too, e.g. S' -> S is added.
+	# they return False if some symbols changed between variable and terminal, the old sets are useless then.
+	#
+	# the old dicts and sets are never modified, they may be shared with a snapshot (see __copy__)
+
+	@staticmethod
+	def symbols_of(keys) -> tuple[set[str], set[str]]:
+		V = {h for h, b in keys}
+		return V, {x for h, b in keys for x in b if x not in V and x != 'ε'} | {'$'}
+
+	def update_first_delta(self, base, added: list[production], removed: list[production]) -> bool:
+		keys, old_S, cache = base
+		P, V, T = self.g.P, self.g.V, self.g.T
+		old_V, old_T = self.symbols_of(keys)
+		if (V & old_T) or (T & old_V): return False
+
+		nullable, first = dict(cache['nullable']), dict(cache['first'])
+		for x in (old_V - V) | (old_T - T):
+			nullable.pop(x, None)
+			first.pop(x, None)
+		for t in T - old_T:
+			nullable[t] = False
+			first[t] = {t}
+		for v in V - old_V:
+			nullable[v] = False
+			first[v] = set()
+
+		by_head = {v: [] for v in V}        # by_head[A]: A-productions
+		users   = {x: set() for x in V | T} # users[X]: heads of the productions whose body contains X
+		for p in P:
+			by_head[p.head].append(p)
+			for x in p.body:
+				if x != 'ε': users[x].add(p.head)
+
+		touched = {p.head for p in added + removed} & V
+		cut = {p.head for p in removed} & V
+		region = set(touched)
+		q = list(touched)
+		while q:
+			for u in users[q.pop()]:
+				if u not in region:
+					region.add(u)
+					q.append(u)
+
+		changed, shrunk = set(), set()
+		for scc in strongly_connected_components(region, lambda v: {x for p in by_head[v] for x in p.body if x in region}):
+			deps = {x for v in scc for p in by_head[v] for x in p.body if x in V} - scc
+			reset = bool(scc & cut or deps & shrunk)
+			if not reset and not (scc & touched or deps & changed): continue
+
+			old = {v: (nullable[v], first[v]) for v in scc}
+			for v in scc:
+				if reset: nullable[v] = False
+				first[v] = set(first[v]) if not reset else set()
+			self.solve_first(scc, by_head, nullable, first)
+			for v in scc:
+				if (nullable[v], first[v]) != old[v]:
+					changed.add(v)
+					if (old[v][0] and not nullable[v]) or not old[v][1].issubset(first[v]):
+						shrunk.add(v)
+
+		self.cache['nullable'], self.cache['first'] = nullable, first
+		self.cached_version['first'] = self.g.version
+		self.record_analysis('first')
+		return True
+
+	def changed_since(self, cache, name) -> set[str]:
+		# the variables whose sets of name differ from the ones of cache, the new variables included
+		old, new = cache[name], self.cache[name]
+		return {v for v in self.g.V if v not in old or (new[v] is not old[v] and new[v] != old[v])}
+
+	def update_follow_delta(self, base, added: list[production], removed: list[production]) -> bool:
+		keys, old_S, cache = base
+		P, V, T, S = self.g.P, self.g.V, self.g.T, self.g.S
+		old_V, old_T = self.symbols_of(keys)
+		if (V & old_T) or (T & old_V) or S not in V: return False
+
+		follow = dict(cache['follow'])
+		for x in old_V - V: follow.pop(x, None)
+		for v in V - old_V: follow[v] = set()
+
+		by_head = {v: [] for v in V}    # by_head[A]: A-productions
+		occurs  = {v: [] for v in V}    # occurs[B]: positions (p, i) where p.body[i] == B
+		for p in P:
+			by_head[p.head].append(p)
+			for i, x in enumerate(p.body):
+				if x in V: occurs[x].append((p, i))
+
+		grow_seeds, cut_seeds = set(), set()
+		for p in added:
+			grow_seeds |= {x for x in p.body if x in V}
+		for p in removed:
+			cut_seeds |= {x for x in p.body if x in V}
+		old_nullable, old_first = cache['nullable'], cache['first']
+		for x in self.changed_since(cache, 'first') & old_V:
+			shrunk = (old_nullable[x] and not self.nullable[x]) or not old_first[x].issubset(self.first[x])
+			for p, i in occurs[x]:
+				(cut_seeds if shrunk else grow_seeds).update(y for y in p.body[:i] if y in V)
+		grow_seeds |= V - old_V
+		if S != old_S:
+			grow_seeds.add(S)
+			if old_S in V: cut_seeds.add(old_S)
+
+		region = grow_seeds | cut_seeds
+		q = list(region)
+		while q:
+			for p in by_head[q.pop()]:
+				for x in p.body:
+					if x in V and x not in region:
+						region.add(x)
+						q.append(x)
+
+		follow_changed, follow_shrunk = set(), set()
+		for scc in strongly_connected_components(region, lambda v: {p.head for p, i in occurs[v] if p.head in region}):
+			deps = {p.head for v in scc for p, i in occurs[v]} - scc
+			reset = bool(scc & cut_seeds or deps & follow_shrunk)
+			if not reset and not (scc & grow_seeds or deps & follow_changed): continue
+
+			old = {v: follow[v] for v in scc}
+			for v in scc:
+				follow[v] = set(follow[v]) if not reset else {'$'} if v == S else set()
+				if v == S: follow[v].add('$')
+			self.solve_follow(scc, occurs, follow)
+			for v in scc:
+				if follow[v] != old[v]:
+					follow_changed.add(v)
+					if not old[v].issubset(follow[v]):
+						follow_shrunk.add(v)
+
+		self.cache['follow'] = follow
+		self.cached_version['follow'] = self.g.version
+		self.record_analysis('follow')
+		return True
 
+	def update_select_delta(self, base, added: list[production], removed: list[production]) -> bool:
+		keys, old_S, cache = base
+		old_V, old_T = self.symbols_of(keys)
+		if (self.g.V & old_T) or (self.g.T & old_V): return False
+		old_select = dict(zip(keys, cache['select']))
+		changed = self.changed_since(cache, 'first')
+		follow_changed = self.changed_since(cache, 'follow')
+		select = list[set[str]]()
+		for p in self.g.P:
+			if (s := old_select.get(p.key())) is None or p.head in follow_changed or any(x in changed for x in p.body):
+				s = self.select_of(p)
+			select.append(s)
+		self.cache['select'] = select
+		self.cached_version['select'] = self.g.version
+		self.record_analysis('select')
+		return True
+
+
+	def remove_verbose_producions_and_sort(self):
 		# remove all of the verbose producions and sort
-		new_productions = []
-		for v in order:
-			new_productions.extend([p for p in self.g.P if p.head == v])
-		self.g.P = new_productions
+		store = production_store(self.g.P)
+		self.g.P = [p for v in self.variable_order(store) for p in store.of(v)]
 		self.update_sets()
 
-	def variable_order(self):
-		q = que.SimpleQueue()
+	def variable_order(self, store = None):
+		# variables reachable from S, in BFS order
+		if store is None: store = production_store(self.g.P)
 		order = [self.g.S]
-		q.put(self.g.S)
-		while not q.empty():
-			v = q.get()
-			for v_candidate in [p for p in self.g.P if p.head == v]:
+		seen = {self.g.S}
+		for v in order:
+			for v_candidate in store.of(v):
 				for tok in v_candidate.body:
-					if tok in self.g.V and tok not in order:
+					if tok in self.g.V and tok not in seen:
+						seen.add(tok)
 						order.append(tok)
-						q.put(tok)
 		return order
 
-	def __init__(self, P, S = None):
+	def __init__(self, P, S = None, backend = 'set'):
+		self.g = grammer()
+		self.cache = dict()
+		self.cached_version = dict()
+		self.analysed = dict()
+		self.backend = backend
 		if not P: return
 		if S == None: S = P[0].head 
 		self.from_production(P.copy(), S)
@@ -490,8 +1221,7 @@ class item_lr0:
 
 	def __init__(self, prod, ppos = 0, is_kernel = False):
 		self.prod = prod
-		if self.prod.body[0] == 'ε': ppos = 1
-		else: self.ppos = ppos
+		self.ppos = ppos if self.prod.body[0] != 'ε' else 1 # A -> ε· is a reduction item
 
 		self.is_kernel = is_kernel
 
@@ -545,6 +1275,307 @@ class action_category(Enum):
 
 
 
+# compact LR(0) / LR(1) state store:
+# an item is packed into an integer:  LR(0): prod_id * stride + ppos
+#                                     LR(1): (prod_id * stride + ppos) * len(lookaheads) + lookahead_id
+# only the kernel of a state is stored, as a sorted array of packed items, 
+# the states are hash-consed (equal kernels share one state id),
+# the closures are recomputed on demand, the recently used ones are kept in a bounded LRU cache
+class state_store:
+
+	def __init__(self, gen, lr1 = False, closure_cache_size = 256):
+		self.gen = gen
+		self.P = gen.g.P
+		self.V = gen.g.V
+		self.lr1 = lr1
+		self.bodys = [tuple(p.body) if p.body[0] != 'ε' else () for p in self.P]
+		self.by_head = dict[str, list[int]]()
+		for i, p in enumerate(self.P): self.by_head.setdefault(p.head, []).append(i)
+
+		self.stride = max(len(b) for b in self.bodys) + 1
+		# lookahead ids, '$' is the end_token
+		self.lookaheads = sorted(gen.g.T - {'$'}) + [end_token()] if lr1 else [None]
+		self.lookahead_id = {b if b != end_token() else '$': i for i, b in enumerate(self.lookaheads)}
+		self.typecode = 'I' if len(self.P) * self.stride * len(self.lookaheads) < 2 ** 32 else 'Q'
+
+		self.kernels = list[array]()     # state id -> kernel
+		self.index = dict[bytes, int]()  # kernel -> state id
+		self.closure_cache = OrderedDict()
+		self.closure_cache_size = closure_cache_size
+		self.predictions = dict[str, tuple]()    # LR(0): variable -> packed items [B -> ·γ] of its closure
+		self.suffix_firsts = dict[tuple, tuple]() # LR(1): (prod_id, ppos) -> (lookahead ids of first(β), β nullable)
+
+	def pack(self, prod_id, ppos, lookahead_id = 0):
+		return (prod_id * self.stride + ppos) * len(self.lookaheads) + lookahead_id
+
+	def unpack(self, item):
+		core, lookahead_id = divmod(item, len(self.lookaheads))
+		return divmod(core, self.stride) + (lookahead_id, )
+
+	def intern(self, kernel) -> int:
+		# returns the id of the state of kernel, a new state is created if it doesn't exist
+		kernel = array(self.typecode, sorted(kernel))
+		if (i := self.index.get(key := kernel.tobytes())) is None:
+			i = self.index[key] = len(self.kernels)
+			self.kernels.append(kernel)
+		return i
+
+	def __len__(self):
+		return len(self.kernels)
+
+	def prediction(self, v):
+		# all of the items [B -> ·γ] of the LR(0) closure of an item [A -> α·vβ]
+		if (result := self.predictions.get(v)) is None:
+			seen, order = {v}, [v]
+			for u in order:
+				for q in self.by_head[u]:
+					if self.bodys[q] and (x := self.bodys[q][0]) in self.V and x not in seen:
+						seen.add(x)
+						order.append(x)
+			result = self.predictions[v] = tuple(self.pack(q, 0) for u in order for q in self.by_head[u])
+		return result
+
+	def suffix_first(self, prod_id, ppos):
+		if (result := self.suffix_firsts.get((prod_id, ppos))) is None:
+			f = self.gen.first_of_seq(list(self.bodys[prod_id][ppos:]))
+			result = self.suffix_firsts[(prod_id, ppos)] = (tuple(self.lookahead_id[b] for b in f if b != 'ε'), 'ε' in f)
+		return result
+
+	def closure(self, state) -> tuple[int]:
+		if (J := self.closure_cache.get(state)) is not None:
+			self.closure_cache.move_to_end(state)
+			return J
+
+		J = set(self.kernels[state])
+		if not self.lr1:
+			for item in self.kernels[state]:
+				prod_id, ppos, _ = self.unpack(item)
+				if ppos < len(self.bodys[prod_id]) and (x := self.bodys[prod_id][ppos]) in self.V:
+					J.update(self.prediction(x))
+		else:
+			work = list(J)
+			while work:
+				prod_id, ppos, lookahead_id = self.unpack(work.pop())
+				if ppos >= len(self.bodys[prod_id]) or (x := self.bodys[prod_id][ppos]) not in self.V: continue
+				firsts, nullable = self.suffix_first(prod_id, ppos + 1)
+				for q in self.by_head[x]:
+					for b in firsts + ((lookahead_id, ) if nullable else ()):
+						if (new_item := self.pack(q, 0, b)) not in J:
+							J.add(new_item)
+							work.append(new_item)
+
+		J = self.closure_cache[state] = tuple(sorted(J))
+		if len(self.closure_cache) > self.closure_cache_size: self.closure_cache.popitem(last = False)
+		return J
+
+	def successors(self, state) -> dict[str, list[int]]:
+		# goto kernels of state: X -> the items of closure(state) with the point moved over X
+		result = dict[str, list[int]]()
+		step = len(self.lookaheads)
+		for item in self.closure(state):
+			prod_id, ppos, _ = self.unpack(item)
+			if ppos < len(self.bodys[prod_id]):
+				result.setdefault(self.bodys[prod_id][ppos], []).append(item + step)
+		return result
+
+	def build(self, *start_kernels) -> list[dict[str, int]]:
+		# builds all of the states reachable from the start kernels, returns the goto table
+		# the state of start_kernels[i] is i
+		goto = list[dict[str, int]]()
+		for kernel in start_kernels: self.intern(kernel)
+		while len(goto) < len(self.kernels):
+			goto.append({x: self.intern(K) for x, K in self.successors(len(goto)).items()})
+		return goto
+
+	def item(self, packed, is_kernel):
+		prod_id, ppos, lookahead_id = self.unpack(packed)
+		if self.lr1: return item_lr1(self.P[prod_id], self.lookaheads[lookahead_id], ppos, is_kernel)
+		return item_lr0(self.P[prod_id], ppos, is_kernel)
+
+	def kernel_items(self, state) -> list:
+		return [self.item(packed, True) for packed in self.kernels[state]]
+
+	def items(self, state) -> set:
+		kernel = set(self.kernels[state])
+		return {self.item(packed, packed in kernel) for packed in self.closure(state)}
+
+# a read-only sequence of item sets, materialized from a state_store on access
+class state_collection:
+	def __init__(self, states: state_store):
+		self.states = states
+	def __len__(self):
+		return len(self.states)
+	def __getitem__(self, state):
+		return self.states.items(state)
+	def __iter__(self):
+		return (self.states.items(i) for i in range(len(self.states)))
+
+
+# a state_store which spills the kernels and the goto table to a sqlite file, for the automata larger than the memory.
+# only about memory_budget bytes of kernels and closures are cached in memory, the rest stay on disk.
+# build() commits every checkpoint_every states, a build interrupted at any point is resumed by building
+# again with the same file, the states committed before are not built again.
+# the connection is closed when the build is interrupted, so the file can be opened again in the same process
+class disk_state_store(state_store):
+
+	def __init__(self, gen, path, lr1 = False, memory_budget = 64 << 20, checkpoint_every = 1024):
+		super().__init__(gen, lr1)
+		self.db = sqlite3.connect(path)
+		self.db.executescript('''
+			create table if not exists meta(key text primary key, value);
+			create table if not exists kernels(id integer primary key, kernel blob unique);
+			create table if not exists goto(state integer, symbol text, target integer);
+			create index if not exists goto_state on goto(state);
+		''')
+		grammer_key = repr(([p.key() for p in self.P], lr1))
+		if (row := self.db.execute("select value from meta where key = 'grammer'").fetchone()) is None:
+			self.db.execute("insert into meta values ('grammer', ?), ('expanded', 0)", (grammer_key, ))
+		elif row[0] != grammer_key:
+			self.close()
+			raise ValueError('{} holds the states of another grammer'.format(path))
+		self.checkpoint_every = checkpoint_every
+		# half of the budget for the kernels, the other half for the closures, about 40 bytes per item of a closure
+		self.kernels = self.index = disk_kernels(self, memory_budget // 2)
+		self.closure_cache_size = max(16, memory_budget // 2 // (40 * max(1, len(self.P))))
+
+	def build(self, *start_kernels):
+		try:
+			for kernel in start_kernels: self.intern(kernel)
+			expanded = self.db.execute("select value from meta where key = 'expanded'").fetchone()[0]
+			while expanded < len(self.kernels):
+				self.db.executemany('insert into goto values (?, ?, ?)', [(expanded, x, self.intern(K)) for x, K in self.successors(expanded).items()])
+				expanded += 1
+				if expanded % self.checkpoint_every == 0: self.checkpoint(expanded)
+			self.checkpoint(expanded)
+		except BaseException:
+			# the uncommitted states are rolled back, the ones committed before are kept for the next build
+			self.close()
+			raise
+		return disk_goto(self)
+
+	def checkpoint(self, expanded):
+		self.db.execute("update meta set value = ? where key = 'expanded'", (expanded, ))
+		self.db.commit()
+
+	def close(self):
+		self.db.close()
+
+# the kernels of a disk_state_store, as its kernels list and its index dict at once:
+# kernels[state] -> kernel, index.get(kernel bytes) -> state, index[kernel bytes] = state
+class disk_kernels:
+	def __init__(self, states: disk_state_store, cache_bytes):
+		self.states = states
+		self.db = states.db
+		self.count = self.db.execute('select count(*) from kernels').fetchone()[0]
+		self.cache = OrderedDict() # state -> kernel, least recently used first
+		self.cache_bytes = cache_bytes
+		self.bytes = 0
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, state) -> array:
+		if (kernel := self.cache.get(state)) is not None:
+			self.cache.move_to_end(state)
+			return kernel
+		row = self.db.execute('select kernel from kernels where id = ?', (state, )).fetchone()
+		if row is None: raise IndexError(state)
+		return self.remember(state, array(self.states.typecode, row[0]))
+
+	def remember(self, state, kernel):
+		self.cache[state] = kernel
+		self.bytes += kernel.itemsize * len(kernel) + 64
+		while self.bytes > self.cache_bytes and len(self.cache) > 1:
+			_, old = self.cache.popitem(last = False)
+			self.bytes -= old.itemsize * len(old) + 64
+		return kernel
+
+	def get(self, key, default = None):
+		row = self.db.execute('select id from kernels where kernel = ?', (key, )).fetchone()
+		return row[0] if row is not None else default
+
+	def __setitem__(self, key, state):
+		self.db.execute('insert into kernels values (?, ?)', (state, key))
+		self.count += 1
+
+	def append(self, kernel):
+		self.remember(self.count - 1, kernel)
+
+# the goto table of a disk_state_store, read on access
+class disk_goto:
+	def __init__(self, states: disk_state_store):
+		self.states = states
+	def __len__(self):
+		return len(self.states)
+	def __getitem__(self, state) -> dict[str, int]:
+		if not 0 <= state < len(self.states): raise IndexError(state)
+		return dict(self.states.db.execute('select symbol, target from goto where state = ?', (state, )))
+	def __iter__(self):
+		return (self[i] for i in range(len(self)))
+
+
+entry_root = '%root%'
+
+def augment_grammer(g, entries) -> list[int]:
+	# widen grammer g: S' -> S for each entry S, returns the indices of the augmented productions.
+	# with several entries a root variable is put in front: %root% -> S1' | S2' | ...,
+	# it only makes '$' follow each entry and never appears in the automaton
+	if isinstance(entries, str): entries = [entries]
+	starts = []
+	for e in entries:
+		if e not in g.V: raise ValueError('entry {} is not a variable'.format(e))
+		s = e + '\''
+		while s in g.V or s in starts: s += '\''
+		starts.append(s)
+	P = [production(s, [e]) for s, e in zip(starts, entries)]
+	if len(entries) > 1: P = [production(entry_root, [s]) for s in starts] + P
+	g.P = P + g.P # g.P may be shared with a snapshot, don't modify it in place
+	return augmented_starts(g.P)
+
+def augmented_starts(P) -> list[int]:
+	# the indices of the augmented productions of a widened grammer
+	k = 0
+	while k < len(P) and P[k].head == entry_root: k += 1
+	return list(range(k, 2 * k)) if k else [0]
+
+
+# counters of slr_pda.profile(), accumulated over the runs
+class parse_profile:
+	def __init__(self, sample_every = 64):
+		# sample_every: time every N-th action of the PDA, 0 for no timing
+		self.sample_every = sample_every
+		self.visits = dict[int, int]()     # state -> number of actions taken in it
+		self.shifts = dict[str, int]()     # terminal -> number of shifts
+		self.reductions = dict[int, int]() # production index -> number of reductions
+		self.times = dict[int, int]()      # state -> nanoseconds of the sampled actions
+		self.samples = dict[int, int]()    # state -> number of the sampled actions
+		self.max_depth = 0
+		self.steps = 0
+		self.runs = 0
+
+	def estimated_time(self, state) -> float:
+		# seconds spent in state, extrapolated from the samples
+		if not self.samples.get(state): return 0.0
+		return self.times[state] / self.samples[state] * self.visits[state] / 1e9
+
+	def report(self, pda, items_collection = None, top = 10):
+		# items_collection: of the generator of pda, to print the items of the hot states,
+		# a lazy_pda has its own
+		P = pda.g.P
+		if items_collection is None and isinstance(pda, lazy_pda): items_collection = state_collection(pda.states)
+		print('runs: {}, actions: {}, max stack depth: {}'.format(self.runs, self.steps, self.max_depth))
+		print('-------------------shifts------------------')
+		for tok, n in sorted(self.shifts.items(), key = lambda x: -x[1])[:top]:
+			print('{: <10} {}'.format(tok, n))
+		print('-----------------reductions----------------')
+		for i, n in sorted(self.reductions.items(), key = lambda x: -x[1])[:top]:
+			print('{: <4} {: <30} {}'.format(str(i) + '.', str(P[i]), n))
+		print('-----------------hot states----------------')
+		for state, n in sorted(self.visits.items(), key = lambda x: -x[1])[:top]:
+			print('{: <3} visits: {}, time: {:.6f}s'.format(str(state) + '.', n, self.estimated_time(state)))
+			if items_collection is not None: print_itemset(items_collection[state])
+
+
 # a SLR(1) PushDown Automaton
 class slr_pda:
 
@@ -572,7 +1603,7 @@ class slr_pda:
 			# self.action[index]...
 			for item in items:
 				if item.is_reduction_item():
-					if item.prod.head == self.g.S:
+					if item.prod.head in self.accepting:
 						# item is an acception item set
 						self.action[index][end_token()] = (action_category.ACCEPT, None)
 					else:
@@ -588,6 +1619,46 @@ class slr_pda:
 							self.action[index][x] = (action_category.GOTO, target_index)
 
 	 # action : list[dict[str | {end_token}, tuple[action_category, int]]]
+	# the same as test(), and counts into profile (a parse_profile), test() itself is left without any counter
+	def profile(self, toks, profile, entry = None):
+		toks = list(toks) + [end_token()]
+		stack = [self.entries[entry] if entry is not None else 0]
+		P = self.g.P
+		action = self.action
+		visits, shifts, reductions = profile.visits, profile.shifts, profile.reductions
+		sample_every = profile.sample_every
+		step = profile.steps
+		tok_index = 0
+		result = None
+		while result is None:
+			tok, state = toks[tok_index], stack[-1]
+			visits[state] = visits.get(state, 0) + 1
+			step += 1
+			if sample_every and step % sample_every == 0: start = perf_counter_ns()
+			if (act := action[state].get(tok)) is None:
+				result = (False, tok_index)
+			elif act[0] == action_category.SHIFT:
+				stack.append(act[1])
+				shifts[tok] = shifts.get(tok, 0) + 1
+				tok_index += 1
+			elif act[0] == action_category.REDUCE:
+				p = P[act[1]]
+				if p.body[0] != 'ε': del stack[-len(p.body):]
+				stack.append(action[stack[-1]][p.head][1])
+				reductions[act[1]] = reductions.get(act[1], 0) + 1
+			elif act[0] == action_category.ACCEPT:
+				result = (True, tok_index - 1)
+			else:
+				result = (False, 'bad teble at index ' + str(tok_index))
+			# a reduction by an ε-production pushes without popping, the stack grows on the gotos too
+			if len(stack) > profile.max_depth: profile.max_depth = len(stack)
+			if sample_every and step % sample_every == 0:
+				profile.times[state] = profile.times.get(state, 0) + perf_counter_ns() - start
+				profile.samples[state] = profile.samples.get(state, 0) + 1
+		profile.steps = step
+		profile.runs += 1
+		return result
+
 	def print_action(self):
 		# for d in self.action:
 		for index, d in enumerate(self.action):
@@ -606,10 +1677,10 @@ class slr_pda:
 
 
 	# test a tok sequence toks whether to be accepted by this SLR PDA
-	def test(self, toks):
+	def test(self, toks, entry = None):
 		toks = toks.copy()
 		toks.append(end_token())
-		stack = [0] # saves the index of item set
+		stack = [self.entries[entry] if entry is not None else 0] # saves the index of item set
 		# alias
 		push = lambda x: stack.append(x)
 		pop  = lambda  : stack.pop()
@@ -635,7 +1706,7 @@ class slr_pda:
 					# reduce
 					# quary the reduce production
 					p = P[arg]
-					for i in range(len(p.body)): pop()
+					for i in range(len(p.body) if p.body[0] != 'ε' else 0): pop()
 					push(action[top()][p.head][1]) # actually is push(goto[top()][p.head])
 				elif category == action_category.ACCEPT:
 					# accept
@@ -650,8 +1721,15 @@ class slr_pda:
 		return (False, len(toks) - 1)
 
 	def __init__(self, slrgen):
-		self.g = slrgen.g
+		self.g = slrgen.g.frozen()
+		self.entries = MappingProxyType(dict(slrgen.entries)) # entry variable -> initial state
+		self.accepting = frozenset(self.g.P[i].head for i in slrgen.starts)
 		self.generate_action(slrgen.gen.follow, slrgen.items_collection, slrgen.goto)
+		self.freeze()
+
+	def freeze(self):
+		# the finished tables are read-only, so a PDA can be shared between threads without locks
+		self.action = tuple(MappingProxyType(row) for row in self.action)
 
 
 # SLR generator
@@ -662,8 +1740,8 @@ class slr_generator:
 	exists_conflict = False
 
 	# LR(0) / SLR(1) automaton:
-	items_collection = list[set]() # [I0, I1, I2, ...]
-	goto = list[dict[str, int]]() # goto(i, X) -> i  (i is index of I, X ∈ V | T)
+	items_collection: list[set]    # [I0, I1, I2, ...]
+	goto: list[dict[str, int]]     # goto(i, X) -> i  (i is index of I, X ∈ V | T)
 
 
 	def print_items(self):
@@ -709,41 +1787,20 @@ class slr_generator:
 	# LR(0), generate item_lr0 set collection 
 	# items function generates items_collection and goto table
 	def items(self):
-		# C should be a list because GOTO function need to target the items set by index
-		C = [ self.closure( { item_lr0(self.g.P[0], is_kernel = True) } ) ] # gen.g.P[0] == [CLOSURE(S' -> ·S)]
-		
-		goto = [dict()]
-		X = self.g.V | self.g.T
-		while True:
-			changed = False
-			for index, I in enumerate(C):
-				for x in X:
-					if len(J := self.try_goto(I, x)) != 0:
-						if J not in C:
-							C.append(J)
-							goto.append(dict())
-							# goto: I * X -> I list[dict[str, int]]
-							if x not in goto[index]:
-								goto[index][x] = len(C) - 1
-							else:
-								# a conflict
-								goto[index][x] = -1
-								exists_conflict = True
-							changed = True
-						else: # J in C
-							goto[index][x] = C.index(J)
-
-			if not changed: break
-
-		self.items_collection = C
-		self.goto = goto
+		# the states are kept in a compact kernel-only store, 
+		# items_collection materializes the item sets on access
+		self.states = state_store(self.gen)
+		self.goto = self.states.build(*[[self.states.pack(i, 0)] for i in self.starts]) # gen.g.P[i] == [CLOSURE(S' -> ·S)]
+		self.items_collection = state_collection(self.states)
 
 
-	def __init__(self, gen):
+	def __init__(self, gen, entries = None):
+		# entries: the start variables sharing this automaton, gen.g.S by default
 		self.gen = copy(gen)
 		self.g = self.gen.g
 		# widen grammer
-		self.g.P.insert(0, production(gen.g.S + '\'', [gen.g.S]))
+		self.starts = augment_grammer(self.g, gen.g.S if entries is None else entries)
+		self.entries = {self.g.P[i].body[0]: state for state, i in enumerate(self.starts)}
 		self.gen.update_sets()
 		self.items()
 
@@ -795,8 +1852,11 @@ class lr1_pda(slr_pda):
 
 
 	def __init__(self, lr1gen):
-		self.g = lr1gen.g
+		self.g = lr1gen.g.frozen()
+		self.entries = MappingProxyType(dict(lr1gen.entries)) # entry variable -> initial state
+		self.accepting = frozenset(self.g.P[i].head for i in lr1gen.starts)
 		self.generate_action(lr1gen.items_collection, lr1gen.goto)
+		self.freeze()
 
 	def generate_action(self, items_collection, goto_table):
 		action = []
@@ -805,7 +1865,7 @@ class lr1_pda(slr_pda):
 			action.append(dict())
 			for item in items:
 				if item.is_reduction_item():
-					if item.prod.head == self.g.S and item.lookahead == end_token():
+					if item.prod.head in self.accepting and item.lookahead == end_token():
 						# item is an acception item set
 						action[index][end_token()] = (action_category.ACCEPT, None)
 					else:
@@ -829,24 +1889,34 @@ class lr1_generator:
 	g = None # grammer
 
 	# Canonical LR(1) automaton:
-	items_collection = list[set]() # [I0, I1, I2, ...]
-	goto = list[dict[str, int]]() # goto(i, X) -> i  (i is index of I, X ∈ V | T)
+	items_collection: list[set]    # [I0, I1, I2, ...]
+	goto: list[dict[str, int]]     # goto(i, X) -> i  (i is index of I, X ∈ V | T)
 
 
 	exists_conflict = False
 
-	def __init__(self, gen, make_augumented_grammer = True):
+	def __init__(self, gen, make_augumented_grammer = True, entries = None, build_items = True, store_path = None, memory_budget = 64 << 20, checkpoint_every = 1024):
+		# entries: the start variables sharing this automaton, gen.g.S by default
+		# build_items: False if only the closure function is needed
+		# store_path: build the states in a disk_state_store of this sqlite file, with about memory_budget bytes in memory,
+		#             committed every checkpoint_every states, building again with the same file resumes an interrupted build
+		self.store_path = store_path
+		self.memory_budget = memory_budget
+		self.checkpoint_every = checkpoint_every
 		self.gen = copy(gen)
 		self.g = self.gen.g
 		# widen grammer
 		if make_augumented_grammer:
-			self.g.P.insert(0, production(gen.g.S + '\'', [gen.g.S]))
+			self.starts = augment_grammer(self.g, gen.g.S if entries is None else entries)
+		else:
+			self.starts = augmented_starts(self.g.P)
+		self.entries = {self.g.P[i].body[0]: state for state, i in enumerate(self.starts)}
 		self.gen.update_sets()
-		self.items()
+		if build_items: self.items()
 
 	# LR(1) automaton:
-	items_collection = list[set[item_lr1]]() # [I0, I1, I2, ...]
-	goto = list[dict[str, int]]() # goto(i, X) -> i  (i is index of I, X ∈ V | T)
+	items_collection: list[set[item_lr1]] # [I0, I1, I2, ...]
+	goto: list[dict[str, int]]            # goto(i, X) -> i  (i is index of I, X ∈ V | T)
 
 	def print_items(self):
 		for index, items in enumerate(self.items_collection):
@@ -892,33 +1962,12 @@ class lr1_generator:
 		return self.closure(J)
 
 	def items(self):
-		C = [ self.closure( { item_lr1(gen.g.P[0], lookahead = end_token(), is_kernel = True) } ) ] # gen.g.P[0] == [CLOSURE(S' -> ·S)]
-		goto = [dict()]
-		
-		X = self.g.V | self.g.T
-
-		while True:
-			changed = False
-			for index, items in enumerate(C):
-				for x in X:
-					if len(J := self.try_goto(items, x)) != 0:
-						if J not in C:
-							C.append(J)
-							goto.append(dict())
-							# goto: I * X -> I list[dict[str, int]]
-							if x not in goto[index]:
-								goto[index][x] = len(C) - 1
-							else:
-								# a conflict
-								goto[index][x] = -1
-								exists_conflict = True
-							changed = True
-						else: # J in C
-							goto[index][x] = C.index(J)
-			if not changed: break
-
-		self.items_collection = C
-		self.goto = goto
+		# the states are kept in a compact kernel-only store, 
+		# items_collection materializes the item sets on access
+		if self.store_path is None: self.states = state_store(self.gen, lr1 = True)
+		else: self.states = disk_state_store(self.gen, self.store_path, True, self.memory_budget, self.checkpoint_every)
+		self.goto = self.states.build(*[[self.states.pack(i, 0, self.states.lookahead_id['$'])] for i in self.starts]) # gen.g.P[i] == [CLOSURE(S' -> ·S)]
+		self.items_collection = state_collection(self.states)
 
 # LALR(1)(Look Ahead LR(1)) Generator
 class lalr_generator(slr_generator):
@@ -931,57 +1980,77 @@ class lalr_generator(slr_generator):
 
 	# exists_conflict = False
 
-	def __init__(self, gen):
+	def __init__(self, gen, entries = None):
+		# entries: the start variables sharing this automaton, gen.g.S by default
 		self.gen = copy(gen)
 		self.g = self.gen.g
 		# widen grammer
-		self.g.P.insert(0, production(gen.g.S + '\'', [gen.g.S]))
+		self.starts = augment_grammer(self.g, gen.g.S if entries is None else entries)
+		self.entries = {self.g.P[i].body[0]: state for state, i in enumerate(self.starts)}
 		self.gen.update_sets()
 		self.items()
 
 	def erase_non_kernel_and_indexing(self):
 		# erase all of the non-kernel item from the items_collection
 		# and convert the item set type from set to list
-		self.items_collection = [[item for item in items if item.is_kernel] for items in self.items_collection] # where item is LR(0) item
-
-
-	def generate_lookahead_propagate_list(self, lr1gen):
-		first = self.gen.first_of_seq
+		self.items_collection = [self.states.kernel_items(i) for i in range(len(self.states))] # where item is LR(0) item
+
+
+	def state_lookahead_edges(self, i, lr1gen) -> list[tuple]:
+		# the lookahead edges out of state i: (source kernel core, X, target kernel core, lookahead),
+		# the target is the state goto[i][X], lookahead is None if it is propagated from the source,
+		# otherwise it is spontaneously generated. the cores are production keys with point positions,
+		# so the edges stay valid when the states or the productions are renumbered (see update()).
+		# the non-kernel reduction items [A -> ε·] of the closure are reduced in state i itself, their edges have X = None
+		edges = []
+		for kernel in self.items_collection[i]:
+			# for all kernel item: A -> α·β
+			# if kernel.current_tok() not in self.g.V: continue # ... in self.g.T is wrong, because of 'ε'
+			# for all kernel item: A -> α·Bω
+			source = (kernel.prod.key(), kernel.ppos)
+			for item in lr1gen.closure({item_lr1.from_core(kernel, None)}): # LR(1) closure
+				if item.is_reduction_item():
+					if not item.is_kernel: edges.append((source, None, (item.prod.key(), item.ppos), item.lookahead))
+					continue
+				edges.append((source, item.current_tok(), (item.prod.key(), item.ppos + 1), item.lookahead))
+		return edges
 
+	def generate_lookahead_propagate_list(self, lr1gen, edges = None):
+		# edges: state -> its lookahead edges if they are already known
+		if edges is None: edges = dict()
+		for i in range(len(self.items_collection)):
+			if i not in edges: edges[i] = self.state_lookahead_edges(i, lr1gen)
+		self.lookahead_edges = edges
 
 		propagate_list = dict[tuple[int, int], set[tuple[int, int]]]()
 
 		# list contains the look ahead grammer symbols of the production 
-		# new_items_collection = [list[tuple[item_lr0, list]]() for i in range(len(self.items_collection))]
 		lookahead_list = [[set() for item in items] for items in self.items_collection]
-		# kernel item [S' -> ·S, $] is spontaneously generated
-		# item_collection index: 0 -> { [S' -> ·S] }
+		index = [{(item.prod.key(), item.ppos): j for j, item in enumerate(items)} for items in self.items_collection]
+		# kernel item [S' -> ·S, $] is spontaneously generated, for each entry S
+		# item_collection index: entries[S] -> { [S' -> ·S] }
 		# item index           : 0 -> [S' -> ·S]
-		lookahead_list[0][0].add(end_token())
-		# new_items_collection[0].add((self.items_collection[0][0], [end_token()]))
-		# new_items_collection[0].add(item_lr1.from_core(self.items_collection[0][0], end_token()))
-
-		for i, kernels in enumerate(self.items_collection):
-			for j, kernel in enumerate(kernels):
-				# for all kernel item: A -> α·β
-				# if kernel.current_tok() not in self.g.V: continue # ... in self.g.T is wrong, because of 'ε'
-				# for all kernel item: A -> α·Bω
-
-				for item in lr1gen.closure({item_lr1.from_core(kernel, None)}): # LR(1) closure
-					if item.is_reduction_item(): continue
-
-					goto_item_set_i = self.goto[i][item.current_tok()]
-					goto_item_i = self.items_collection[goto_item_set_i].index(item.next().core())
-					target = (goto_item_set_i, goto_item_i)
-					# print(item)
-					if item.lookahead is None:
-						# this lookahead symbol is propagated from kernel
-						if (i, j) not in propagate_list: 
-							propagate_list[(i, j)] = set()
-						propagate_list[(i, j)].add(target)
-					else:
-						# this lookahead symbol is spontaneously generate
-						lookahead_list[goto_item_set_i][goto_item_i].add(item.next().lookahead)
+		for state in self.entries.values(): lookahead_list[state][0].add(end_token())
+
+		productions = {p.key(): p for p in self.g.P}
+		for i, state_edges in edges.items():
+			for source, X, target_core, lookahead in state_edges:
+				if X is None:
+					# [A -> ε·] of the closure of state i, it takes a slot after the kernel items
+					if (j := index[i].get(target_core)) is None:
+						j = index[i][target_core] = len(self.items_collection[i])
+						self.items_collection[i].append(item_lr0(productions[target_core[0]], target_core[1]))
+						lookahead_list[i].append(set())
+					target = (i, j)
+				else:
+					goto_item_set_i = self.goto[i][X]
+					target = (goto_item_set_i, index[goto_item_set_i][target_core])
+				if lookahead is None:
+					# this lookahead symbol is propagated from kernel
+					propagate_list.setdefault((i, index[i][source]), set()).add(target)
+				else:
+					# this lookahead symbol is spontaneously generate
+					lookahead_list[target[0]][target[1]].add(lookahead)
 
 		return lookahead_list, propagate_list
 
@@ -1016,180 +2085,671 @@ class lalr_generator(slr_generator):
 		super().items() # generate LR(0) items_collection and goto
 		self.erase_non_kernel_and_indexing() 
 		
-		lr1gen = lr1_generator(self.gen, False)
+		lr1gen = lr1_generator(self.gen, False, build_items = False) # only for the LR(1) closure
 		lookahead_list, propagate_list = self.generate_lookahead_propagate_list(lr1gen) # new_item_collection is a LALR(1) item set collection
 		self.propagate(lookahead_list, propagate_list)
 		# print_itemset(self.items_collection)
+
+	# incremental rebuild after the productions are edited: returns a new lalr_generator of P
+	# (the productions without the augmented ones), self is left unchanged.
+	#
+	# a state whose closure has no item of an edited variable (the head of an added or removed production)
+	# has the same closure and the same successors as before, so they are copied instead of computed;
+	# if none of the symbols of its closure changed their first set either, its lookahead edges are copied too.
+	# the lookaheads are then propagated again over the whole automaton, it's cheap against the closures.
+	#
+	# the surviving states keep their ids where possible, the report is left in the new generator:
+	#   changed_states: ids whose kernel items, lookaheads or gotos differ from the state with the same id before
+	#   production_index: old production index -> new one, for patching the REDUCE actions
+	#   rebuilt_states: number of the states whose closures were computed
+	def update(self, P):
+		old_states, old_P = self.states, self.g.P
+		k = max(self.starts) + 1 # the augmented productions are g.P[:k]
+		new = copy(self)
+		new.gen = copy(self.gen)
+		new.g = new.gen.g
+		new.g.P = list(old_P[:k]) + list(P)
+		new.gen.update_sets()
+
+		old_keys = {p.key() for p in old_P}
+		new_keys = {p.key() for p in new.g.P}
+		# the heads of the added or removed productions, and the symbols which changed between terminal and variable
+		switched = new.g.V ^ self.gen.g.V
+		either = new.g.V | self.gen.g.V
+		edited = {h for h, b in old_keys ^ new_keys} | switched
+		new.production_index = {}
+		new_index = {p.key(): i for i, p in enumerate(new.g.P)}
+		for i, p in enumerate(old_P):
+			if (j := new_index.get(p.key())) is not None: new.production_index[i] = j
+
+		# reach[v]: the variables of the LR(0) closure of [· v], it reaches an edited variable
+		# in the old grammer iff it does in the new one, the paths before it are not edited
+		reach = dict()
+		def reaching(v):
+			if (r := reach.get(v)) is None:
+				r = reach[v] = {old_P[old_states.unpack(q)[0]].head for q in old_states.prediction(v)} if v in old_states.by_head else {v}
+			return r
+		changed_first = {v for v in new.g.V if v not in self.gen.g.V or new.gen.nullable[v] != self.gen.nullable.get(v) or new.gen.first[v] != self.gen.first[v]}
+		changed_first |= {v for v in self.gen.g.V if v not in new.g.V} | edited | (new.g.T ^ self.gen.g.T)
+
+		def clean(old_id):
+			# (same closure, same lookahead edges)
+			heads, symbols = set(), set()
+			for packed in old_states.kernels[old_id]:
+				prod_id, ppos, _ = old_states.unpack(packed)
+				heads.add(old_P[prod_id].head)
+				symbols.update(old_states.bodys[prod_id][ppos:])
+				if ppos < len(old_states.bodys[prod_id]) and (x := old_states.bodys[prod_id][ppos]) in either: heads |= reaching(x)
+			# a closure item [B -> ·x β] predicts x in the new grammer if x turned into a variable
+			leading = {old_states.bodys[q][0] for v in heads for q in old_states.by_head.get(v, ()) if old_states.bodys[q]}
+			if (heads | leading) & edited: return False, False
+			symbols.update(x for v in heads for q in old_states.by_head.get(v, ()) for x in old_states.bodys[q])
+			return True, not (symbols & changed_first)
+
+		key_of = lambda states, P, kernel: tuple(sorted((P[prod_id].key(), ppos) for prod_id, ppos, _ in map(states.unpack, kernel)))
+		old_index = {key_of(old_states, old_P, K): i for i, K in enumerate(old_states.kernels)}
+
+		# LR(0) automaton, states in BFS order first
+		states = state_store(new.gen)
+		translate = lambda packed: (lambda prod_id, ppos, _: states.pack(new_index[old_P[prod_id].key()], ppos))(*old_states.unpack(packed))
+		goto, old_id_of, reuse_edges = [], [], set()
+		for i in self.starts: states.intern([states.pack(i, 0)])
+		new.rebuilt_states = 0
+		while len(goto) < len(states):
+			i = len(goto)
+			old_id = old_index.get(key_of(states, new.g.P, states.kernels[i]))
+			old_id_of.append(old_id)
+			same_closure, same_edges = clean(old_id) if old_id is not None else (False, False)
+			if same_closure:
+				goto.append({X: states.intern([translate(packed) for packed in old_states.kernels[t]]) for X, t in self.goto[old_id].items()})
+				if same_edges: reuse_edges.add(i)
+			else:
+				goto.append({X: states.intern(K) for X, K in states.successors(i).items()})
+				new.rebuilt_states += 1
+
+		# keep the old ids of the surviving states, the others take the free ids
+		n = len(goto)
+		final = [None] * n
+		taken = set()
+		for i, old_id in enumerate(old_id_of):
+			if old_id is not None and old_id < n and old_id not in taken:
+				final[i] = old_id
+				taken.add(old_id)
+		free = iter(sorted(set(range(n)) - taken))
+		for i in range(n):
+			if final[i] is None: final[i] = next(free)
+		order = sorted(range(n), key = lambda i: final[i])
+		new.states = state_store(new.gen)
+		for i in order: new.states.intern(states.kernels[i])
+		new.goto = [{X: final[t] for X, t in goto[i].items()} for i in order]
+		new.entries = {X: final[i] for X, i in self.entries.items()}
+
+		# lookaheads
+		new.erase_non_kernel_and_indexing()
+		edges = {final[i]: self.lookahead_edges[old_id_of[i]] for i in reuse_edges}
+		lr1gen = lr1_generator(new.gen, False, build_items = False)
+		lookahead_list, propagate_list = new.generate_lookahead_propagate_list(lr1gen, edges)
+		new.propagate(lookahead_list, propagate_list)
+
+		# report
+		state_key = lambda gen, i: (
+			frozenset((item.prod.key(), item.ppos, item.lookahead) for item in gen.items_collection[i]),
+			frozenset(gen.goto[i].items())
+		)
+		new.changed_states = {i for i in range(n) if i >= len(self.goto) or state_key(new, i) != state_key(self, i)}
+		return new
 		
 
-# # test
-# P = lex(r'''
-# 		S' -> S
-# 		S -> E
-# 		E -> T | E
-# 		T -> F T
-# 		F -> char
-# 		  -> (E)
-# 		  -> F*
-# 		  -> F+
-#  	''')
-
-# P = lex(r'''
-# 	E -> E + T
-# 	  -> T
-# 	T -> T * F
-# 	  -> F
-# 	F -> (E)
-# 	  -> id
-#  ''')
-
-# P = lex('''
-# 	S -> C C
-# 	C -> c C
-# 	  -> d
-# ''')
-
-# P = lex(r'''
-# 	S -> L = R 
-# 	  -> R
-# 	L -> * R 
-# 	  -> id
-# 	R -> L
-# ''')
-
-P = lex(r'''
-
-	S -> DeclList Expr 
-
-	DeclList	-> id = literal DeclList'
-				-> :
-	DeclList'	-> , id = literal DeclList'
-				-> :
-
-	Expr	-> Expr binop Expr
-			-> preop Expr
-			-> ( Expr )
-			-> id ( Expr )
-			-> [ ExprList ]
-			-> IfExpr
-			-> WhileExpr
-			-> id
-			-> literal
-
-	IfExpr		-> if(Expr): Expr ElseExpr
-	ElseExpr	-> elif(Expr): Expr ElseExpr
-				-> else: Expr
-	WhileExpr	-> while(Expr): Expr
-
-	ExprList	-> Expr ExprList'
-				->
-	ExprList'	-> , Expr ExprList'
-				->
-
-
-''')
-
-# P = lex(r'''
-# 	S -> E
-# 	E -> E + T
-# 	  -> E - T
-# 	  -> T
-# 	T -> T * F
-# 	  -> T / F
-# 	  -> F
-# 	F -> num
-# 	  -> (E)
-
-# 	''')
-
-# P = lex('''
-# 	S	-> a A d
-# 		-> b B d
-# 		-> a B e
-# 		-> b A e
-# 	A	-> c
-# 	B	-> c
-# ''')
-
-# P = lex(r'''
-# 	S -> A a
-# 	  -> b
-# 	A -> A c
-# 	  -> S d
-# 	  -> 
-# ''')
-
-# P = lex(r'''
-# 	S -> A
-# 	  -> w
-# 	A -> B
-# 	  -> m
-# 	B -> b
-# 	C -> D
-# 	D -> A
-# 	  -> S
-# 	  ->
-# 	S -> S a S b
-# 	  -> B B S
-# 	''')
-
-gen = generator(P)
-print_productions(gen.g.P)
-print('-------remove-empty-production--------')
-gen.remove_empty_productions()
-print_all(gen)
-# print('-------remove-single-production-------')
-# gen.remove_single_productions()
-# print_productions(gen.g.P)
-# print('--------remove-left-recursion---------')
-# gen.remove_left_recursion(by_order = True, allow_empty_production = True)
-# print_productions(
-# gen.remove_direct_left_recursion('S', gen.g.P)
-# )
-# print_productions(gen.g.P)
-# print('--------remove-verbose-productions---------')
-# gen.remove_verbose_producions_and_sort()
-# print_productions(gen.g.P)
-# print_all(gen)
-# print('---------------SLR-Generator---------------')
-# slr_gen = slr_generator(copy(gen))
-# print_all(slr_gen.gen)
-# print('-------------------items-------------------')
-# slr_gen.print_items()
-# print('-------------------goto--------------------')
-# slr_gen.print_goto()
-# print('-----------------SLR-PDA-------------------')
-# slr = slr_pda(slr_gen)
-# slr.print_action()
-# print('-----------------test-PDA------------------')
-# seq = ['id', '*', 'id']
-# print(' '.join(seq))
-# print(slr.test(seq))
-# print('----------Canonical-LR-Generator-----------')
-# lr1_gen = lr1_generator(generator(copy(P)))
-# print_all(lr1_gen.gen)
-# print('-------------------items-------------------')
-# lr1_gen.print_items()
-# print('-------------------goto--------------------')
-# lr1_gen.print_goto()
-# print('-----------------LR(1)-PDA-----------------')
-# lr1 = lr1_pda(lr1_gen)
-# lr1.print_action()
-# print('-----------------test-PDA------------------')
-# seq = ['*', 'id', '=', 'id']
-# print(' '.join(seq))
-# print(lr1.test(seq))
-print('--------------LALR-Generator---------------')
-lalr_gen = lalr_generator(gen)
-# print_all(lalr_gen.gen)
-print('-------------------items-------------------')
-lalr_gen.print_items()
-print('-------------------goto--------------------')
-lalr_gen.print_goto()
-print('------------LALR/LR(1)-PDA-----------------')
-lalr = lr1_pda(lalr_gen)
-lalr.print_action()
-print('-----------------test-PDA------------------')
-seq = ['id', '=', 'literal', ':', 'id']
-print(' '.join(seq))
-print(lalr.test(seq))
\ No newline at end of file
+# Minimal LR(1) Generator, by Pager's weak compatibility:
+# a new LR(1) state is merged into an existing state of the same core 
+# whenever the merge introduces no reduce/reduce conflict that the canonical LR(1) automaton doesn't have, 
+# so the automaton is LALR-sized in most cases while it recognizes the canonical LR(1) grammers
+class pager_generator(lr1_generator):
+
+	@staticmethod
+	def weakly_compatible(old: dict, new: dict) -> bool:
+		# old, new: kernel item core -> lookaheads, of the same core
+		# two states are weakly compatible iff for each pair of kernel items i ≠ j:
+		#   (old[i] ∩ new[j] = Φ and new[i] ∩ old[j] = Φ) or old[i] ∩ old[j] ≠ Φ or new[i] ∩ new[j] ≠ Φ
+		cores = list(old)
+		for a, i in enumerate(cores):
+			for j in cores[a + 1:]:
+				if (old[i] & new[j] or new[i] & old[j]) and not (old[i] & old[j] or new[i] & new[j]):
+					return False
+		return True
+
+	def kernel_items(self, kernel: dict) -> set[item_lr1]:
+		return {item_lr1(prod, b, ppos, is_kernel = True) for (prod, ppos), lookaheads in kernel.items() for b in lookaheads}
+
+	def items(self):
+		kernels = [ {(self.g.P[i], 0): {end_token()}} for i in self.starts ] # kernels[i]: (production, point position) -> lookaheads
+		by_core = {frozenset(K): [i] for i, K in enumerate(kernels)}
+		goto = [dict() for K in kernels]
+		X = self.g.V | self.g.T
+
+		work = list(range(len(kernels)))
+		while work:
+			i = work.pop()
+			successors = {x: dict() for x in X}
+			for item in self.closure(self.kernel_items(kernels[i])):
+				if item.is_reduction_item(): continue
+				successors[item.current_tok()].setdefault((item.prod, item.ppos + 1), set()).add(item.lookahead)
+
+			for x, K in successors.items():
+				if not K: continue
+				core = frozenset(K)
+				candidates = by_core.setdefault(core, [])
+				# try the previous target of this transition first
+				if x in goto[i]: candidates = [goto[i][x]] + [j for j in candidates if j != goto[i][x]]
+				for j in candidates:
+					if self.weakly_compatible(kernels[j], K):
+						if any(not lookaheads.issubset(kernels[j][c]) for c, lookaheads in K.items()):
+							for c, lookaheads in K.items(): kernels[j][c] |= lookaheads
+							work.append(j) # lookaheads grew, propagate them to the successors again
+						break
+				else:
+					j = len(kernels)
+					kernels.append({c: set(lookaheads) for c, lookaheads in K.items()})
+					goto.append(dict())
+					by_core[core].append(j)
+					work.append(j)
+				goto[i][x] = j
+
+		# the transitions may have moved away from some states, renumber the reachable states
+		order = list(range(len(self.starts)))
+		index = {i: i for i in order}
+		for i in order:
+			for j in goto[i].values():
+				if j not in index:
+					index[j] = len(order)
+					order.append(j)
+
+		self.items_collection = [self.closure(self.kernel_items(kernels[i])) for i in order]
+		self.goto = [{x: index[j] for x, j in goto[i].items()} for i in order]
+
+
+# a PDA whose automaton is built while parsing: a state is only interned when a goto reaches it,
+# and its closure, goto and action row are computed the first time the parser enters it.
+# canonical LR(1) (lr1 = True) or SLR(1) rows, LALR(1) lookaheads need the whole automaton
+class lazy_pda(slr_pda):
+
+	def __init__(self, gen, entries = None, lr1 = True):
+		self.gen = copy(gen)
+		self.starts = augment_grammer(self.gen.g, gen.g.S if entries is None else entries)
+		self.gen.update_sets()
+		self.g = self.gen.g.frozen()
+		self.accepting = frozenset(self.g.P[i].head for i in self.starts)
+		self.states = state_store(self.gen, lr1)
+		end_id = len(self.states.lookaheads) - 1 if lr1 else 0
+		self.entries = MappingProxyType({self.g.P[i].body[0]: self.states.intern([self.states.pack(i, 0, end_id)]) for i in self.starts})
+		self.rows = dict[int, MappingProxyType]() # state -> action row, the memoized part of the automaton
+		self.lock = Lock()
+		self.action = lazy_action(self)
+
+	def row(self, state) -> MappingProxyType:
+		if (row := self.rows.get(state)) is not None: return row
+		with self.lock:
+			if (row := self.rows.get(state)) is not None: return row
+			states = self.states
+			row = dict()
+			for packed in states.closure(state):
+				prod_id, ppos, lookahead_id = states.unpack(packed)
+				if ppos < len(states.bodys[prod_id]): continue
+				head = self.g.P[prod_id].head
+				lookaheads = [states.lookaheads[lookahead_id]] if states.lr1 else [x if x != '$' else end_token() for x in self.gen.follow[head]]
+				for b in lookaheads:
+					if head in self.accepting:
+						if b == end_token(): row[b] = (action_category.ACCEPT, None)
+					else:
+						row[b] = (action_category.REDUCE, prod_id)
+			for x, K in states.successors(state).items():
+				row[x] = (action_category.SHIFT if x not in self.g.V else action_category.GOTO, states.intern(K))
+			row = self.rows[state] = MappingProxyType(row)
+			states.closure_cache.pop(state, None) # the row is all that a visited state needs
+		return row
+
+	def save(self, f):
+		# persist the states discovered so far, load() continues from them
+		pickle.dump({
+			'productions': [p.key() for p in self.g.P],
+			'lr1': self.states.lr1,
+			'kernels': [k.tobytes() for k in self.states.kernels],
+			'rows': {state: dict(row) for state, row in self.rows.items()}
+		}, f)
+
+	def load(self, f):
+		saved = pickle.load(f)
+		if saved['productions'] != [p.key() for p in self.g.P] or saved['lr1'] != self.states.lr1:
+			raise ValueError('the saved states belong to another grammer')
+		with self.lock:
+			states = self.states
+			states.kernels, states.index = [], dict()
+			for key in saved['kernels']:
+				states.index[key] = len(states.kernels)
+				states.kernels.append(array(states.typecode, key))
+			states.closure_cache.clear()
+			self.rows = {state: MappingProxyType(row) for state, row in saved['rows'].items()}
+
+# lazy_pda.action: rows are computed on access
+class lazy_action:
+	def __init__(self, pda: lazy_pda):
+		self.pda = pda
+	def __len__(self):
+		return len(self.pda.states)
+	def __getitem__(self, state):
+		return self.pda.row(state)
+	def __iter__(self):
+		i = 0
+		while i < len(self.pda.states):
+			yield self.pda.row(i)
+			i += 1
+
+
+# a PDA whose deterministic runs are fused into single steps ("superinstructions"):
+# a state whose only terminal moves reduce the same production reduces it whatever comes next, or the next token is an error.
+# entering such a state by a shift or a goto from state t starts a chain of reductions and gotos which only
+# depends on t as long as no reduction pops below t, so the chain is precomputed per (t, X):
+#   fused[t][X] = (SHIFT or GOTO, the entered state, the states pushed above t, the productions reduced in order)
+# and applied at once. the other actions are copied into fused[t] too, as (category, argument, (), ()),
+# so a step looks up its token once. the results are the same as slr_pda.test: the errors are found before the next shift,
+# so at the same token. the reductions of a chain are reported to on_reduce once the next token has an action,
+# on an error the chain is replayed by the table, so the reported reductions are the ones the table run makes
+class fused_pda:
+
+	def __init__(self, pda, max_chain = 32):
+		self.pda = pda
+		self.g = pda.g
+		self.entries = pda.entries
+		self.action = pda.action
+		P = self.g.P
+		self.lengths = [len(p.body) if p.body[0] != 'ε' else 0 for p in P]
+		self.heads = [p.head for p in P]
+
+		# default[s]: the production that state s reduces on every lookahead, or None
+		self.default = []
+		for row in self.action:
+			moves = {act for x, act in row.items() if x not in self.g.V}
+			self.default.append(next(iter(moves))[1] if len(moves) == 1 and next(iter(moves))[0] == action_category.REDUCE else None)
+
+		self.fused = [dict() for row in self.action]
+		self.fused_steps = 0 # number of the reductions folded into the fused steps
+		for t, row in enumerate(self.action):
+			for x, (category, target) in row.items():
+				if category not in (action_category.SHIFT, action_category.GOTO):
+					self.fused[t][x] = (category, target, (), ())
+					continue
+				pushed, reduced = [target], []
+				while (p := self.default[pushed[-1]]) is not None and self.lengths[p] < len(pushed) + 1 and len(reduced) < max_chain:
+					if self.lengths[p]: del pushed[-self.lengths[p]:]
+					pushed.append(self.action[pushed[-1] if pushed else t][self.heads[p]][1])
+					reduced.append(p)
+				self.fused[t][x] = (category, target, tuple(pushed), tuple(reduced))
+				self.fused_steps += len(reduced)
+		self.fused = tuple(MappingProxyType(row) for row in self.fused)
+
+	# the same as slr_pda.test, on_reduce(production index) is called for each reduction in order
+	def test(self, toks, entry = None, on_reduce = None):
+		fused, lengths, heads = self.fused, self.lengths, self.heads
+		stack = [self.entries[entry] if entry is not None else 0]
+		end = end_token()
+		tok_index = 0
+		n = len(toks)
+		pending = None # (stack below the chain, the entered state, its reductions) not reported yet
+		while True:
+			tok = toks[tok_index] if tok_index < n else end
+			if (step := fused[stack[-1]].get(tok)) is None:
+				if pending is not None: self.replay(stack, pending, tok, on_reduce)
+				return (False, tok_index)
+			if pending is not None:
+				for p in pending[2]: on_reduce(p)
+				pending = None
+			category, arg, pushed, reduced = step
+			if category == action_category.SHIFT:
+				tok_index += 1
+			elif category == action_category.REDUCE:
+				if lengths[arg]: del stack[-lengths[arg]:]
+				if on_reduce is not None: on_reduce(arg)
+				category, arg, pushed, reduced = fused[stack[-1]][heads[arg]]
+			elif category == action_category.ACCEPT:
+				return (True, tok_index - 1)
+			else:
+				return (False, 'bad teble at index ' + str(tok_index))
+			if reduced and on_reduce is not None: pending = (len(stack), arg, reduced)
+			stack.extend(pushed)
+
+	def replay(self, stack, pending, tok, on_reduce):
+		# reports the reductions of a fused chain which the table makes before it finds tok is an error,
+		# stack[:base] is left as it was before the chain, which never pops below it
+		base, state, reduced = pending
+		stack = stack[:base] + [state]
+		for p in reduced:
+			if self.action[stack[-1]].get(tok) != (action_category.REDUCE, p): return
+			on_reduce(p)
+			if self.lengths[p]: del stack[-self.lengths[p]:]
+			stack.append(self.action[stack[-1]][self.heads[p]][1])
+
+
+# Earley parser, for the grammers which are neither LL(1) nor LR(1), even ambiguous ones
+# an item is an int tuple (production index, point position, origin), chart[i] holds the items ending at token i.
+# the ε-productions are handled as Aycock and Horspool do: predicting a nullable variable also moves the point over it.
+# Leo's optimization: when a completed item [A -> α·, j] has only one item [B -> β·A, k] waiting for A in chart[j],
+# the topmost item of that deterministic chain is added at once instead of every item of the chain, so right
+# recursion runs in linear time (the topmost items are memoized per (j, A) in leo[j]).
+# the chart starts from an augmented item [S' -> ·S, 0], so accepting doesn't depend on the completed S-items,
+# which a Leo jump may step over
+class earley_parser:
+
+	def __init__(self, gen, S = None):
+		self.P = gen.g.P
+		self.V = gen.g.V
+		self.S = gen.g.S if S is None else S
+		self.nullable = {v: gen.nullable[v] for v in self.V}
+		self.bodys = [tuple(p.body) if p.body[0] != 'ε' else () for p in self.P]
+		self.heads = [p.head for p in self.P]
+		self.by_head = {v: [] for v in self.V}
+		for i, p in enumerate(self.P): self.by_head[p.head].append(i)
+		self.starts = dict[str, int]() # S -> index of the augmented production S' -> S
+
+	def start_of(self, S) -> int:
+		# the augmented production of S, its head (S, ) is not a variable of the grammer
+		if S not in self.starts:
+			self.starts[S] = len(self.bodys)
+			self.bodys.append((S, ))
+			self.heads.append((S, ))
+		return self.starts[S]
+
+	def chart_of(self, toks, leo = True, S = None) -> tuple[list[list[tuple]], int]:
+		# returns (chart, number of the charts filled), the charts stop growing at the first bad token
+		bodys, heads, by_head, nullable, V = self.bodys, self.heads, self.by_head, self.nullable, self.V
+		chart = [list[tuple]() for i in range(len(toks) + 1)]
+		seen = [set[tuple]() for i in range(len(toks) + 1)]
+		waiting = [dict[str, list[tuple]]() for i in range(len(toks) + 1)] # waiting[j][A]: items of chart[j] with the point before A
+		leo_items = [dict() for i in range(len(toks) + 1)]
+
+		def add(i, item):
+			if item not in seen[i]:
+				seen[i].add(item)
+				chart[i].append(item)
+
+		def topmost(j, A):
+			# the topmost item of the deterministic reduction path over A at j, or None
+			if A in leo_items[j]: return leo_items[j][A]
+			leo_items[j][A] = None # a cycle is not deterministic
+			result = None
+			if len(w := waiting[j].get(A, ())) == 1 and w[0][1] + 1 == len(bodys[w[0][0]]):
+				prod_id, ppos, origin = w[0]
+				result = topmost(origin, heads[prod_id]) or (prod_id, ppos + 1, origin)
+			leo_items[j][A] = result
+			return result
+
+		add(0, (self.start_of(S or self.S), 0, 0))
+		for i in range(len(toks) + 1):
+			items = chart[i]
+			k = 0
+			while k < len(items):
+				prod_id, ppos, origin = item = items[k]
+				k += 1
+				body = bodys[prod_id]
+				if ppos == len(body):
+					# complete
+					A = heads[prod_id]
+					# chart[i] is still growing, only the finished charts have deterministic paths
+					if leo and origin != i and (top := topmost(origin, A)) is not None:
+						add(i, top)
+						continue
+					for prod_id2, ppos2, origin2 in (waiting[origin].get(A, ()) if origin != i else list(waiting[i].get(A, ()))):
+						add(i, (prod_id2, ppos2 + 1, origin2))
+				elif (x := body[ppos]) in V:
+					# predict
+					waiting[i].setdefault(x, []).append(item)
+					for q in by_head[x]: add(i, (q, 0, i))
+					if nullable[x]: add(i, (prod_id, ppos + 1, origin)) # Aycock-Horspool
+				elif i < len(toks) and x == toks[i]:
+					# scan
+					add(i + 1, (prod_id, ppos + 1, origin))
+			if i < len(toks) and not chart[i + 1]: return chart, i + 1
+		return chart, len(toks) + 1
+
+	def accepted(self, chart, n, S = None) -> bool:
+		return (self.start_of(S or self.S), 1, 0) in chart[n]
+
+	# recognize toks, the result is the same as slr_pda.test
+	def test(self, toks, entry = None) -> tuple:
+		chart, filled = self.chart_of(toks, S = entry)
+		if filled <= len(toks): return (False, filled - 1)
+		if self.accepted(chart, len(toks), entry): return (True, len(toks) - 1)
+		return (False, len(toks))
+
+	# parse toks, returns a parse tree: (variable, [subtrees...]) or a terminal, None if toks is rejected.
+	# the tree needs all of the completed items, so the chart is built without Leo's optimization.
+	# an ambiguous toks gets one of its trees
+	def parse(self, toks):
+		chart, filled = self.chart_of(toks, leo = False)
+		if filled <= len(toks) or not self.accepted(chart, len(toks)): return None
+		bodys, heads, V, nullable = self.bodys, self.heads, self.V, self.nullable
+		# ends[i][A]: the ends of the completed A-items starting at i
+		# first[j][A, i]: (index in chart[j], production) of the first completed A-item from i to j,
+		# the A-items of the same span which it was completed from come before it in chart[j], so choosing them never cycles
+		ends = [dict[str, set[int]]() for i in range(len(toks) + 1)]
+		first = [dict[tuple, tuple]() for i in range(len(toks) + 1)]
+		for j, items in enumerate(chart):
+			for r, (prod_id, ppos, origin) in enumerate(items):
+				if ppos == len(bodys[prod_id]):
+					ends[origin].setdefault(heads[prod_id], set()).add(j)
+					first[j].setdefault((heads[prod_id], origin), (r, prod_id))
+		# the empty spans take a fixed ε-derivation of each nullable variable, each uses only the variables found before it
+		empty = dict[str, int]()
+		for round in V:
+			for prod_id, body in enumerate(bodys):
+				if heads[prod_id] in V and heads[prod_id] not in empty and all(x in empty for x in body): empty[heads[prod_id]] = prod_id
+
+		def split(prod_id, i, j, r):
+			# the children (a terminal or (variable, start, end)) of prod_id deriving toks[i:j]
+			body = bodys[prod_id]
+			back = [dict[int, tuple]() for k in range(len(body) + 1)] # back[k][m]: body[:k] derives toks[i:m], (m of body[:k - 1], child)
+			back[0][i] = None
+			for k, x in enumerate(body):
+				for m in back[k]:
+					if x not in V:
+						if m < j and toks[m] == x: back[k + 1].setdefault(m + 1, (m, x))
+						continue
+					if nullable[x]: back[k + 1].setdefault(m, (m, (x, m, m)))
+					for e in ((j, ) if k + 1 == len(body) else ends[m].get(x, ())):
+						if m < e <= j and e in ends[m].get(x, ()) and ((m, e) != (i, j) or first[j][x, i][0] < r):
+							back[k + 1].setdefault(e, (m, (x, m, e)))
+			children, m = [], j
+			for k in range(len(body), 0, -1):
+				m, child = back[k][m]
+				children.append(child)
+			return children[::-1]
+
+		# the tree is built top-down with an explicit stack, a long toks doesn't recurse deeply
+		tree = (self.S, [])
+		stack = [(tree, 0, len(toks))]
+		while stack:
+			(A, subtrees), i, j = stack.pop()
+			if i == j: children = [(x, i, i) for x in bodys[empty[A]]]
+			else: children = split(first[j][A, i][1], i, j, first[j][A, i][0])
+			for child in children:
+				if isinstance(child, str): subtrees.append(child)
+				else:
+					subtrees.append((child[0], []))
+					stack.append((subtrees[-1], child[1], child[2]))
+		return tree
+
+
+if __name__ == '__main__':
+
+	# # test
+	# P = lex(r'''
+	# 		S' -> S
+	# 		S -> E
+	# 		E -> T | E
+	# 		T -> F T
+	# 		F -> char
+	# 		  -> (E)
+	# 		  -> F*
+	# 		  -> F+
+	#  	''')
+
+	# P = lex(r'''
+	# 	E -> E + T
+	# 	  -> T
+	# 	T -> T * F
+	# 	  -> F
+	# 	F -> (E)
+	# 	  -> id
+	#  ''')
+
+	# P = lex('''
+	# 	S -> C C
+	# 	C -> c C
+	# 	  -> d
+	# ''')
+
+	# P = lex(r'''
+	# 	S -> L = R 
+	# 	  -> R
+	# 	L -> * R 
+	# 	  -> id
+	# 	R -> L
+	# ''')
+
+	P = lex(r'''
+
+		S -> DeclList Expr 
+
+		DeclList	-> id = literal DeclList'
+					-> :
+		DeclList'	-> , id = literal DeclList'
+					-> :
+
+		Expr	-> Expr binop Expr
+				-> preop Expr
+				-> ( Expr )
+				-> id ( Expr )
+				-> [ ExprList ]
+				-> IfExpr
+				-> WhileExpr
+				-> id
+				-> literal
+
+		IfExpr		-> if(Expr): Expr ElseExpr
+		ElseExpr	-> elif(Expr): Expr ElseExpr
+					-> else: Expr
+		WhileExpr	-> while(Expr): Expr
+
+		ExprList	-> Expr ExprList'
+					->
+		ExprList'	-> , Expr ExprList'
+					->
+
+
+	''')
+
+	# P = lex(r'''
+	# 	S -> E
+	# 	E -> E + T
+	# 	  -> E - T
+	# 	  -> T
+	# 	T -> T * F
+	# 	  -> T / F
+	# 	  -> F
+	# 	F -> num
+	# 	  -> (E)
+
+	# 	''')
+
+	# P = lex('''
+	# 	S	-> a A d
+	# 		-> b B d
+	# 		-> a B e
+	# 		-> b A e
+	# 	A	-> c
+	# 	B	-> c
+	# ''')
+
+	# P = lex(r'''
+	# 	S -> A a
+	# 	  -> b
+	# 	A -> A c
+	# 	  -> S d
+	# 	  -> 
+	# ''')
+
+	# P = lex(r'''
+	# 	S -> A
+	# 	  -> w
+	# 	A -> B
+	# 	  -> m
+	# 	B -> b
+	# 	C -> D
+	# 	D -> A
+	# 	  -> S
+	# 	  ->
+	# 	S -> S a S b
+	# 	  -> B B S
+	# 	''')
+
+	gen = generator(P)
+	print_productions(gen.g.P)
+	print('-------remove-empty-production--------')
+	gen.remove_empty_productions()
+	print_all(gen)
+	# print('-------remove-single-production-------')
+	# gen.remove_single_productions()
+	# print_productions(gen.g.P)
+	# print('--------remove-left-recursion---------')
+	# gen.remove_left_recursion(by_order = True, allow_empty_production = True)
+	# print_productions(
+	# gen.remove_direct_left_recursion('S', gen.g.P)
+	# )
+	# print_productions(gen.g.P)
+	# print('--------remove-verbose-productions---------')
+	# gen.remove_verbose_producions_and_sort()
+	# print_productions(gen.g.P)
+	# print_all(gen)
+	print('-------merge-equivalent-variables----------')
+	gen.merge_equivalent_variables()
+	# print('---------------SLR-Generator---------------')
+	# slr_gen = slr_generator(copy(gen))
+	# print_all(slr_gen.gen)
+	# print('-------------------items-------------------')
+	# slr_gen.print_items()
+	# print('-------------------goto--------------------')
+	# slr_gen.print_goto()
+	# print('-----------------SLR-PDA-------------------')
+	# slr = slr_pda(slr_gen)
+	# slr.print_action()
+	# print('-----------------test-PDA------------------')
+	# seq = ['id', '*', 'id']
+	# print(' '.join(seq))
+	# print(slr.test(seq))
+	# print('----------Canonical-LR-Generator-----------')
+	# lr1_gen = lr1_generator(generator(copy(P)))
+	# print_all(lr1_gen.gen)
+	# print('-------------------items-------------------')
+	# lr1_gen.print_items()
+	# print('-------------------goto--------------------')
+	# lr1_gen.print_goto()
+	# print('-----------------LR(1)-PDA-----------------')
+	# lr1 = lr1_pda(lr1_gen)
+	# lr1.print_action()
+	# print('-----------------test-PDA------------------')
+	# seq = ['*', 'id', '=', 'id']
+	# print(' '.join(seq))
+	# print(lr1.test(seq))
+	print('--------------LALR-Generator---------------')
+	lalr_gen = lalr_generator(gen)
+	# print_all(lalr_gen.gen)
+	print('-------------------items-------------------')
+	lalr_gen.print_items()
+	print('-------------------goto--------------------')
+	lalr_gen.print_goto()
+	print('------------LALR/LR(1)-PDA-----------------')
+	lalr = lr1_pda(lalr_gen)
+	lalr.print_action()
+	print('-----------------test-PDA------------------')
+	seq = ['id', '=', 'literal', ':', 'id']
+	print(' '.join(seq))
+	print(lalr.test(seq))
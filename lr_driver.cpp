@@ -0,0 +1,38 @@
+/*
+	reference driver of the tables exported by c_export.py:
+
+	python c_export.py grammer.y lr_tables.hpp
+	g++ -std=c++20 -O2 -o lr_driver lr_driver.cpp
+
+	reads one token sequence per line (terminal names separated by spaces),
+	and prints "accept <index>" or "reject <index>", the same as parse_service.py
+*/
+
+#include <string>
+#include <vector>
+#include <sstream>
+#include <iostream>
+
+// g++ -DLR_TABLES_HEADER='"expr_tables.hpp"' -DLR_TABLES_NAMESPACE=expr_tables ... for the other tables
+#ifndef LR_TABLES_HEADER
+#define LR_TABLES_HEADER "lr_tables.hpp"
+#endif
+#ifndef LR_TABLES_NAMESPACE
+#define LR_TABLES_NAMESPACE lr_tables
+#endif
+#include LR_TABLES_HEADER
+
+using namespace rais::LR_TABLES_NAMESPACE;
+
+int main() {
+	std::string line, name;
+	std::vector<int> toks;
+	while(std::getline(std::cin, line)) {
+		toks.clear();
+		std::istringstream names{line};
+		while(names >> name) toks.push_back(terminal_of(name)); // an unknown name is rejected by parse
+		const auto [accepted, index] = parse(toks.data(), toks.size());
+		std::cout << (accepted ? "accept " : "reject ") << index << '\n';
+	}
+	return 0;
+}
@@ -0,0 +1,401 @@
+'''
+
+parse_service.py
+
+	an asyncio front end of the LR(1) / LALR(1) PDAs of grammer_preprocess.py:
+
+	parse_tables    read-only ACTION/GOTO tables of a lr1_pda, one per grammer, shared by all of the requests
+	table_pool      builds the parse_tables of each grammer once, in an executor
+	parse_run       an incremental run of the PDA, fed one token at a time
+	batch_validator accepts/rejects a batch of short token sequences in lockstep with numpy
+	result_cache    LRU cache of the results of the repeated token sequences, per table fingerprint
+	parse_service   parses (async) token iterators, yields to the event loop every N tokens,
+	                offloads the oversized inputs to a thread/process pool and records per-request latency
+
+	usage:
+	python parse_service.py          parse the token sequences of stdin, one sequence per line
+	python parse_service.py <port>   the same, served on a local socket
+
+'''
+
+
+import sys
+import time
+import asyncio
+import hashlib
+from types import MappingProxyType
+from collections import deque, OrderedDict
+from functools import partial
+from grammer_preprocess import end_token, action_category, generator, lalr_generator, lr1_pda, loads_grammer
+
+
+class parse_tables:
+	# action[state][tok] -> (action_category, arg), the same as lr1_pda.action
+	# lengths[i]: number of states popped by reducing production i
+	# heads[i]  : head of production i
+	# entries   : entry variable -> initial state
+	# fingerprint: digest of all of the above, equal tables have equal fingerprints
+	def __init__(self, action, lengths, heads, entries = None):
+		object.__setattr__(self, 'action', tuple(MappingProxyType(dict(row)) for row in action))
+		object.__setattr__(self, 'lengths', tuple(lengths))
+		object.__setattr__(self, 'heads', tuple(heads))
+		object.__setattr__(self, 'entries', MappingProxyType(dict(entries or {})))
+		h = hashlib.blake2b(digest_size = 16)
+		for row in self.action:
+			h.update(repr(sorted((str(x), category.value, arg) for x, (category, arg) in row.items())).encode())
+		h.update(repr((self.lengths, self.heads, sorted(self.entries.items()))).encode())
+		object.__setattr__(self, 'fingerprint', h.digest())
+
+	@classmethod
+	def from_pda(cls, pda):
+		P = pda.g.P
+		return cls(pda.action, [len(p.body) if p.body[0] != 'ε' else 0 for p in P], [p.head for p in P], pda.entries)
+
+	def __setattr__(self, name, value):
+		raise AttributeError('parse_tables is read-only')
+
+	def __reduce__(self):
+		# mappingproxy can't be pickled, a process pool needs it
+		return (parse_tables, ([dict(row) for row in self.action], self.lengths, self.heads, dict(self.entries)))
+
+
+class parse_run:
+	# result: None while running, (True, index of the last token) if accepted, (False, index of the bad token) if rejected
+	def __init__(self, tables: parse_tables, entry = None):
+		self.tables = tables
+		self.stack = [tables.entries[entry] if entry is not None else 0]
+		self.position = 0
+		self.result = None
+
+	def feed(self, tok) -> bool:
+		# returns False when the run is finished
+		action, stack = self.tables.action, self.stack
+		while True:
+			if (act := action[stack[-1]].get(tok)) is None:
+				self.result = (False, self.position)
+				return False
+			category, arg = act
+			if category == action_category.SHIFT:
+				stack.append(arg)
+				self.position += 1
+				return True
+			elif category == action_category.REDUCE:
+				if self.tables.lengths[arg]: del stack[-self.tables.lengths[arg]:]
+				stack.append(action[stack[-1]][self.tables.heads[arg]][1])
+			elif category == action_category.ACCEPT:
+				self.result = (True, self.position - 1)
+				return False
+			else:
+				self.result = (False, 'bad teble at index ' + str(self.position))
+				return False
+
+	def finish(self):
+		if self.result is None: self.feed(end_token())
+		return self.result
+
+
+def build_tables(P, generator_class = lalr_generator, entries = None) -> parse_tables:
+	return parse_tables.from_pda(lr1_pda(generator_class(generator(P), entries = entries)))
+
+
+def parse_tokens(tables: parse_tables, toks, entry = None) -> tuple:
+	# synchronous parse of a whole token sequence, also the job sent to the executor
+	run = parse_run(tables, entry)
+	for tok in toks:
+		if not run.feed(tok): return run.result
+	return run.finish()
+
+
+class batch_validator:
+	# accept/reject many short token sequences at once: all of them are advanced in lockstep,
+	# one action per sequence per step, by gathers on dense numpy ACTION/GOTO arrays.
+	#
+	# kind[state, tok]: 0 error, 1 shift, 2 reduce, 3 accept;  arg[state, tok]: the shift state or the production
+	# goto[state, var]: the goto state
+	# the token ids are the indexes of self.terminals, end_id for the end of input (also the padding),
+	# unknown_id for the terminals which never appear in the tables
+	ERROR, SHIFT, REDUCE, ACCEPT = range(4)
+
+	def __init__(self, tables: parse_tables):
+		import numpy as np
+		self.tables = tables
+		terminals, variables = set(), set()
+		for row in tables.action:
+			for x, (category, _) in row.items():
+				if category == action_category.GOTO: variables.add(x)
+				elif not isinstance(x, end_token): terminals.add(x)
+		self.terminals = sorted(terminals)
+		self.variables = sorted(variables | set(tables.heads))
+		self.terminal_id = {t: i for i, t in enumerate(self.terminals)}
+		self.end_id = len(self.terminals)
+		self.unknown_id = self.end_id + 1
+		variable_id = {v: i for i, v in enumerate(self.variables)}
+
+		n = len(tables.action)
+		self.kind = np.zeros((n, self.unknown_id + 1), dtype = np.int8)
+		self.arg = np.zeros((n, self.unknown_id + 1), dtype = np.int32)
+		self.goto = np.zeros((n, len(self.variables)), dtype = np.int32)
+		kinds = {action_category.SHIFT: self.SHIFT, action_category.REDUCE: self.REDUCE, action_category.ACCEPT: self.ACCEPT}
+		for state, row in enumerate(tables.action):
+			for x, (category, arg) in row.items():
+				if category == action_category.GOTO:
+					self.goto[state, variable_id[x]] = arg
+					continue
+				tok = self.end_id if isinstance(x, end_token) else self.terminal_id[x]
+				self.kind[state, tok] = kinds.get(category, self.ERROR)
+				self.arg[state, tok] = arg if arg is not None else 0
+		self.lengths = np.array(tables.lengths, dtype = np.int32)
+		self.heads = np.array([variable_id[h] for h in tables.heads], dtype = np.int32)
+
+	def encode(self, seqs):
+		# token sequences -> padded 2-D array of token ids, each row ends with at least one end_id
+		import numpy as np
+		seqs = list(seqs)
+		ids = np.full((len(seqs), max(map(len, seqs), default = 0) + 1), self.end_id, dtype = np.int32)
+		for r, seq in enumerate(seqs):
+			ids[r, :len(seq)] = [self.terminal_id.get(tok, self.unknown_id) for tok in seq]
+		return ids
+
+	def validate(self, ids, entry = None):
+		# ids: padded 2-D int array of token ids (see encode), every row must reach an end_id
+		# returns (accepted, positions): a bool array, and per row the index of the last token if
+		# accepted or of the bad token if rejected, the same as the indexes of slr_pda.test
+		import numpy as np
+		ids = np.asarray(ids, dtype = np.int32)
+		rows_count, width = ids.shape
+		depth = 2 * width + 16
+		stacks = np.zeros((rows_count, depth), dtype = np.int32)
+		stacks[:, 0] = self.tables.entries[entry] if entry is not None else 0
+		sp = np.ones(rows_count, dtype = np.int64)  # stack sizes
+		pos = np.zeros(rows_count, dtype = np.int64)
+		accepted = np.zeros(rows_count, dtype = bool)
+		positions = np.zeros(rows_count, dtype = np.int64)
+
+		rows = np.arange(rows_count) # the running rows
+		while rows.size:
+			if sp[rows].max() + 1 >= depth: # ε-reductions may push more states than tokens
+				stacks = np.concatenate((stacks, np.zeros_like(stacks)), axis = 1)
+				depth *= 2
+			state = stacks[rows, sp[rows] - 1]
+			tok = ids[rows, np.minimum(pos[rows], width - 1)]
+			kind = self.kind[state, tok]
+			arg = self.arg[state, tok]
+
+			shift = kind == self.SHIFT
+			r = rows[shift]
+			stacks[r, sp[r]] = arg[shift]
+			sp[r] += 1
+			pos[r] += 1
+
+			reduce = kind == self.REDUCE
+			r, p = rows[reduce], arg[reduce]
+			sp[r] -= self.lengths[p]
+			stacks[r, sp[r]] = self.goto[stacks[r, sp[r] - 1], self.heads[p]]
+			sp[r] += 1
+
+			done = (kind == self.ACCEPT) | (kind == self.ERROR)
+			r = rows[done]
+			accepted[r] = kind[done] == self.ACCEPT
+			positions[r] = pos[r] - accepted[r]
+			rows = rows[~done]
+		return accepted, positions
+
+	def validate_seqs(self, seqs, entry = None):
+		return self.validate(self.encode(seqs), entry)
+
+
+class result_cache:
+	# (table fingerprint, entry, digest of the tokens) -> result of parse_tokens, least recently used first.
+	# a result is dropped when the cache holds more than max_entries results or about max_bytes bytes,
+	# and all of the results of some tables are dropped when the tables are replaced (see table_pool.register)
+	entry_overhead = 200 # bytes of the key, the result tuple and the OrderedDict node, roughly
+
+	def __init__(self, max_entries = 65536, max_bytes = 64 << 20):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.results = OrderedDict()
+		self.sizes = dict[bytes, int]() # fingerprint -> number of its results
+		self.bytes = 0
+		self.hits = self.misses = self.evictions = self.invalidations = 0
+
+	@staticmethod
+	def key(tables: parse_tables, toks, entry = None):
+		h = hashlib.blake2b(digest_size = 16)
+		for tok in toks:
+			h.update(tok.encode())
+			h.update(b'\0')
+		return (tables.fingerprint, entry, h.digest())
+
+	def get(self, key):
+		if (result := self.results.get(key)) is None:
+			self.misses += 1
+			return None
+		self.results.move_to_end(key)
+		self.hits += 1
+		return result
+
+	def put(self, key, result):
+		if key in self.results: return
+		self.results[key] = result
+		self.sizes[key[0]] = self.sizes.get(key[0], 0) + 1
+		self.bytes += self.entry_overhead + sys.getsizeof(result[1])
+		while len(self.results) > self.max_entries or self.bytes > self.max_bytes:
+			self.drop(*self.results.popitem(last = False))
+			self.evictions += 1
+
+	def drop(self, key, result):
+		self.bytes -= self.entry_overhead + sys.getsizeof(result[1])
+		if (n := self.sizes[key[0]] - 1): self.sizes[key[0]] = n
+		else: del self.sizes[key[0]]
+
+	def invalidate(self, fingerprint):
+		if fingerprint not in self.sizes: return
+		for key in [key for key in self.results if key[0] == fingerprint]:
+			self.drop(key, self.results.pop(key))
+			self.invalidations += 1
+
+	def parse(self, tables: parse_tables, toks, entry = None) -> tuple:
+		# parse_tokens in front of the cache
+		toks = list(toks)
+		if (result := self.get(key := self.key(tables, toks, entry))) is None:
+			result = parse_tokens(tables, toks, entry)
+			self.put(key, result)
+		return result
+
+	def stats(self) -> dict:
+		total = self.hits + self.misses
+		return {
+			'entries': len(self.results), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses,
+			'hit_rate': self.hits / total if total else 0.0, 'evictions': self.evictions, 'invalidations': self.invalidations
+		}
+
+
+class table_pool:
+	# grammer name -> parse_tables, each of them is built once and shared afterwards
+	def __init__(self, executor = None):
+		self.executor = executor
+		self.builders = dict()
+		self.tables = dict[str, parse_tables]()
+		self.building = dict()
+		self.replaced = list() # callbacks, called with the old parse_tables when a grammer is registered again
+
+	def register(self, name: str, builder):
+		# builder() -> parse_tables
+		self.builders[name] = builder
+		self.building.pop(name, None)
+		if (old := self.tables.pop(name, None)) is not None:
+			for callback in self.replaced: callback(old)
+
+	def register_grammer(self, name: str, P, generator_class = lalr_generator, entries = None):
+		self.register(name, partial(build_tables, P, generator_class, entries))
+
+	async def get(self, name: str) -> parse_tables:
+		if (tables := self.tables.get(name)) is not None: return tables
+		if name not in self.building:
+			self.building[name] = asyncio.get_running_loop().run_in_executor(self.executor, self.builders[name])
+		building = self.building[name]
+		tables = await asyncio.shield(building)
+		if self.building.get(name) is building: # not registered again meanwhile
+			self.tables[name] = tables
+			del self.building[name]
+		return tables
+
+
+class latency_metrics:
+	# the latest samples: (grammer name, number of tokens, seconds, accepted)
+	def __init__(self, size = 10000):
+		self.samples = deque(maxlen = size)
+		self.count = 0
+		self.accepted = 0
+
+	def record(self, name, tokens, seconds, accepted):
+		self.samples.append((name, tokens, seconds, accepted))
+		self.count += 1
+		self.accepted += bool(accepted)
+
+	def summary(self) -> dict:
+		if not self.samples: return {'count': self.count, 'accepted': self.accepted}
+		t = sorted(s[2] for s in self.samples)
+		pct = lambda q: t[min(len(t) - 1, int(q * len(t)))] * 1000
+		return {
+			'count': self.count, 'accepted': self.accepted,
+			'mean_ms': sum(t) / len(t) * 1000, 'p50_ms': pct(0.5), 'p90_ms': pct(0.9), 'p99_ms': pct(0.99), 'max_ms': t[-1] * 1000
+		}
+
+
+class parse_service:
+	def __init__(self, pool: table_pool = None, yield_every = 256, offload_threshold = 65536, executor = None, cache: result_cache = None):
+		# executor: runs the oversized inputs, None for the default thread pool, or a ProcessPoolExecutor
+		# cache   : caches the results of the token sequences (not of the async iterators), None to disable
+		self.pool = pool if pool is not None else table_pool()
+		self.yield_every = yield_every
+		self.offload_threshold = offload_threshold
+		self.executor = executor
+		self.metrics = latency_metrics()
+		self.cache = cache
+		if cache is not None: self.pool.replaced.append(lambda tables: cache.invalidate(tables.fingerprint))
+
+	async def parse(self, name: str, tokens, entry = None) -> tuple:
+		# tokens: an async iterator or a sequence of terminals
+		# entry : the start variable to parse, the default one if None
+		# returns the same as slr_pda.test
+		tables = await self.pool.get(name)
+		start = time.perf_counter()
+		key = None
+		if self.cache is not None and hasattr(tokens, '__len__'):
+			if (result := self.cache.get(key := self.cache.key(tables, tokens, entry))) is not None:
+				self.metrics.record(name, len(tokens), time.perf_counter() - start, result[0] is True)
+				return result
+		if hasattr(tokens, '__len__') and len(tokens) > self.offload_threshold:
+			count = len(tokens)
+			result = await asyncio.get_running_loop().run_in_executor(self.executor, parse_tokens, tables, tokens, entry)
+		else:
+			run = parse_run(tables, entry)
+			count = 0
+			async for tok in self.aiter(tokens):
+				count += 1
+				if not run.feed(tok): break
+				if count % self.yield_every == 0: await asyncio.sleep(0)
+			result = run.finish()
+		if key is not None: self.cache.put(key, result)
+		self.metrics.record(name, count, time.perf_counter() - start, result[0] is True)
+		return result
+
+	@staticmethod
+	async def aiter(tokens):
+		if hasattr(tokens, '__aiter__'):
+			async for tok in tokens: yield tok
+		else:
+			for tok in tokens: yield tok
+
+	async def handle_connection(self, reader, writer, name):
+		# one token sequence per line, answers 'accept <index>' or 'reject <index>'
+		while line := await reader.readline():
+			accepted, index = await self.parse(name, line.decode().split())
+			writer.write('{} {}\n'.format('accept' if accepted is True else 'reject', index).encode())
+			await writer.drain()
+		writer.close()
+
+	async def serve(self, name, host = '127.0.0.1', port = 0):
+		return await asyncio.start_server(lambda r, w: self.handle_connection(r, w, name), host, port)
+
+
+async def main(argv):
+	service = parse_service(cache = result_cache())
+	service.pool.register_grammer('expr', loads_grammer('''
+		E : E '+' T | T ;
+		T : T '*' F | F ;
+		F : '(' E ')' | id ;
+	''').P)
+	if len(argv) > 1:
+		server = await service.serve('expr', port = int(argv[1]))
+		async with server: await server.serve_forever()
+	else:
+		loop = asyncio.get_running_loop()
+		while line := await loop.run_in_executor(None, sys.stdin.readline):
+			print(await service.parse('expr', line.split()))
+		print(service.metrics.summary())
+		print(service.cache.stats())
+
+if __name__ == '__main__':
+	asyncio.run(main(sys.argv))
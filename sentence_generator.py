@@ -0,0 +1,184 @@
+'''
+
+sentence_generator.py
+
+	random sentences of a grammer, for load testing and fuzzing the parsers and lexers
+
+	sentence_generator  derives random sentences towards a target length, as arrays of terminal ids
+	                    (the terminal dictionary of token_stream.py), optionally mutated into near-miss inputs
+
+	termination: min_length[v] is the length of the shortest terminal string derived from v (Knuth's
+	generalization of Dijkstra's algorithm), a production is only chosen while the sentence can still be
+	finished within the target length, afterwards each variable takes its shortest production.
+	the longer productions are preferred while the sentence is far from the target length, and so are the
+	productions adding no terminals whose variables can grow (L -> L I)
+
+	usage:
+	python sentence_generator.py <grammer file> [count] [length]   print random sentences of a load_grammer file
+
+'''
+
+
+import sys
+import heapq
+import random
+from array import array
+from bisect import bisect
+from itertools import accumulate
+from grammer_preprocess import generator
+
+
+inf = float('inf')
+
+
+class sentence_generator:
+	# gen    : a generator or a grammer
+	# weights: production index -> weight of choosing it among the productions of its head, 1 by default
+	def __init__(self, gen, weights = None, seed = None, S = None):
+		g = gen.g if isinstance(gen, generator) else gen
+		self.P = list(g.P)
+		self.S = S or g.S or self.P[0].head
+		V = {p.head for p in self.P}
+		self.terminals = sorted({x for p in self.P for x in p.body if x not in V and x != 'ε'})
+		self.terminal_id = {t: i for i, t in enumerate(self.terminals)}
+		self.variables = sorted(V)
+		variable_id = {v: i for i, v in enumerate(self.variables)}
+		# a body symbol: terminal id >= 0, or ~variable id < 0
+		self.bodys = [tuple(self.terminal_id[x] if x not in V else ~variable_id[x] for x in p.body if x != 'ε') for p in self.P]
+		self.heads = [variable_id[p.head] for p in self.P]
+		self.random = random.Random(seed)
+		self.weights = [1.0] * len(self.P)
+		for i, w in (weights or {}).items(): self.weights[i] = w
+		self.compute_min_length()
+
+	def compute_min_length(self):
+		# min_length[v], and shortest[v]: a production of v deriving a string of min_length[v],
+		# the bodys of shortest[...] only refer to the variables finished before, so following them always terminates
+		n = len(self.variables)
+		self.min_length = [inf] * n
+		self.shortest = [None] * n
+		users = [[] for i in range(n)]  # users[v]: productions whose body contains v, once per occurrence
+		pending = [0] * len(self.P)     # number of the unfinished variable occurrences of each production
+		partial = [0] * len(self.P)     # length of the finished part of each body
+		heap = []
+		for i, body in enumerate(self.bodys):
+			for x in body:
+				if x < 0:
+					users[~x].append(i)
+					pending[i] += 1
+				else: partial[i] += 1
+			if pending[i] == 0: heapq.heappush(heap, (partial[i], i))
+		done = [False] * n
+		while heap:
+			length, i = heapq.heappop(heap)
+			if done[v := self.heads[i]]: continue
+			done[v] = True
+			self.min_length[v], self.shortest[v] = length, i
+			for j in users[v]:
+				partial[j] += length
+				pending[j] -= 1
+				if pending[j] == 0 and not done[self.heads[j]]: heapq.heappush(heap, (partial[j], j))
+
+		# per variable: its productions that can finish, their cumulative weights and extra lengths over the minimum
+		self.choices = [[] for i in range(n)]
+		for i, body in enumerate(self.bodys):
+			if (length := sum(self.min_length[~x] if x < 0 else 1 for x in body)) < inf and self.weights[i] > 0:
+				self.choices[self.heads[i]].append((i, length - self.min_length[self.heads[i]]))
+		self.cumulative = [list(accumulate(self.weights[i] for i, extra in c)) for c in self.choices]
+		# growable[v]: v can derive a string longer than min_length[v], directly or through a variable of a body
+		self.growable = [any(extra > 0 for i, extra in c) for c in self.choices]
+		changed = True
+		while changed:
+			changed = False
+			for v, c in enumerate(self.choices):
+				if not self.growable[v] and any(x < 0 and self.growable[~x] for i, extra in c for x in self.bodys[i]):
+					self.growable[v] = changed = True
+		if self.min_length[self.variables.index(self.S)] == inf: raise ValueError('the language of {} is empty'.format(self.S))
+
+	def sentence(self, length = 16) -> array:
+		# a random sentence of about length terminals (at least the shortest one of S), as terminal ids
+		rnd = self.random.random
+		out = array('i')
+		start = ~self.variables.index(self.S)
+		stack = [start]
+		owed = [False]                    # owed[k]: stack[k] is a growable variable of a production adding no terminals (L -> L I)
+		owing = 0                         # which was chosen to grow the sentence, a terminal of the slack is kept for each of them
+		pending = self.min_length[~start] # shortest length of the symbols on the stack
+		budget = 8 * (length + 1)         # expansions left before every variable takes its shortest production,
+		                                  # the productions adding no terminals (S -> S B, B -> ε) could go on forever
+		while stack:
+			x, promised = stack.pop(), owed.pop()
+			if x >= 0:
+				out.append(x)
+				pending -= 1
+				continue
+			v = ~x
+			owing -= promised
+			pending -= self.min_length[v]
+			slack = length - len(out) - pending - owing - self.min_length[v] # extra terminals this variable may add
+			choices, cumulative = self.choices[v], self.cumulative[v]
+			p, promising = None, False
+			budget -= 1
+			if slack > 0 and budget > 0:
+				# the further from the target, the more likely a production which makes the sentence longer,
+				# a production adding no terminals grows the sentence through its growable variables
+				grow = promised or rnd() * length < slack
+				for tries in range(8):
+					i, extra = choices[bisect(cumulative, rnd() * cumulative[-1])]
+					promising = grow and extra == 0 and any(y < 0 and self.growable[~y] for y in self.bodys[i])
+					if extra <= slack and (not grow or extra > 0 or promising):
+						p = i
+						break
+			if p is None: p, promising = self.shortest[v], False
+			body = self.bodys[p]
+			stack.extend(reversed(body))
+			if promising:
+				owed.extend(y < 0 and self.growable[~y] for y in reversed(body))
+				owing += sum(y < 0 and self.growable[~y] for y in body)
+			else: owed.extend([False] * len(body))
+			pending += sum(self.min_length[~y] if y < 0 else 1 for y in body)
+		return out
+
+	def mutate(self, ids: array) -> array:
+		# a near miss: one token deleted, inserted, replaced, or two neighbours swapped
+		rnd = self.random
+		ids = array('i', ids)
+		kind = rnd.randrange(4) if len(ids) > 1 else rnd.choice((1, 2)) if ids else 1
+		i = rnd.randrange(len(ids)) if ids else 0
+		if kind == 0: del ids[i]
+		elif kind == 1: ids.insert(rnd.randrange(len(ids) + 1), rnd.randrange(len(self.terminals)))
+		elif kind == 2: ids[i] = rnd.randrange(len(self.terminals))
+		else:
+			i = min(i, len(ids) - 2)
+			ids[i], ids[i + 1] = ids[i + 1], ids[i]
+		return ids
+
+	def stream(self, count = None, length = 16, mutation_rate = 0.0, check = None):
+		# yields (ids, mutated), count sentences or forever
+		# mutation_rate: probability of a sentence being mutated
+		# check(tokens) -> bool: if given, a mutated sentence is mutated again (a few times) until check rejects it,
+		#                        e.g. lambda toks: pda.test(toks)[0] is True
+		n = 0
+		while count is None or n < count:
+			ids = self.sentence(length)
+			mutated = self.random.random() < mutation_rate
+			if mutated:
+				for tries in range(8):
+					ids = self.mutate(ids)
+					if check is None or not check(self.tokens(ids)): break
+			yield ids, mutated
+			n += 1
+
+	def tokens(self, ids) -> list[str]:
+		return [self.terminals[i] for i in ids]
+
+
+if __name__ == '__main__':
+	from grammer_preprocess import load_grammer
+	if len(sys.argv) < 2:
+		print(__doc__)
+		sys.exit()
+	with open(sys.argv[1]) as f: spec = load_grammer(f, sys.argv[1])
+	sg = sentence_generator(generator(spec.P, spec.S))
+	for ids, mutated in sg.stream(int(sys.argv[2]) if len(sys.argv) > 2 else 10, int(sys.argv[3]) if len(sys.argv) > 3 else 16):
+		print(' '.join(sg.tokens(ids)))
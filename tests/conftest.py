@@ -0,0 +1,5 @@
+# the modules of this repo are scripts at its root
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
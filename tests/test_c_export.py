@@ -0,0 +1,46 @@
+import os
+import shutil
+import subprocess
+import pytest
+from c_export import export_header
+from grammer_preprocess import loads_grammer, generator, lalr_generator, lr1_generator, slr_generator, lr1_pda, slr_pda
+from sentence_generator import sentence_generator
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+grammers = {
+	'expr': '''
+		E : E '+' T | T ;
+		T : T '*' F | F ;
+		F : '(' E ')' | id ;
+	''',
+	'lists': '''
+		S  : D E ;
+		D  : id '=' literal Dp | ':' ;
+		Dp : ',' id '=' literal Dp | ':' ;
+		E  : '[' L ']' | id | '-' E ;
+		L  : E Lp | ;
+		Lp : ',' E Lp | ;
+	''',
+}
+
+
+@pytest.mark.skipif(shutil.which('g++') is None, reason = 'needs g++')
+@pytest.mark.parametrize('name', grammers)
+@pytest.mark.parametrize('kind', ['lalr', 'lr1', 'slr'])
+def test_driver_agrees_with_the_pda(tmp_path, name, kind):
+	gen = generator(loads_grammer(grammers[name]).P)
+	pda = slr_pda(slr_generator(gen)) if kind == 'slr' else lr1_pda((lalr_generator if kind == 'lalr' else lr1_generator)(gen))
+	with open(tmp_path / 'tables.hpp', 'w') as f: export_header(pda, f, name)
+	driver = tmp_path / 'lr_driver'
+	subprocess.run(['g++', '-std=c++20', '-O1', '-I', str(tmp_path), '-DLR_TABLES_HEADER="tables.hpp"', '-DLR_TABLES_NAMESPACE=' + name,
+		'-o', str(driver), os.path.join(root, 'lr_driver.cpp')], check = True)
+
+	sg = sentence_generator(gen, seed = 49)
+	corpus = [sg.tokens(ids) for ids, mutated in sg.stream(400, 12, mutation_rate = 0.5)]
+	corpus += [[], ['unknown'], ['id', 'unknown']]
+	out = subprocess.run([str(driver)], input = ''.join(' '.join(toks) + '\n' for toks in corpus), capture_output = True, text = True, check = True).stdout
+	expected = ['{} {}'.format('accept' if accepted is True else 'reject', index) for accepted, index in map(pda.test, corpus)]
+	assert out.splitlines() == expected
+	assert any(line.startswith('accept') for line in expected) and any(line.startswith('reject') for line in expected)
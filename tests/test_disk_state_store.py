@@ -0,0 +1,37 @@
+import sqlite3
+import pytest
+from grammer_preprocess import loads_grammer, generator, lr1_generator, disk_state_store
+
+
+source = '''
+	S  : D E ;
+	D  : id '=' literal Dp | ':' ;
+	Dp : ',' id '=' literal Dp | ':' ;
+	E  : '[' L ']' | id | '-' E | E '+' E ;
+	L  : E Lp | ;
+	Lp : ',' E Lp | ;
+'''
+
+
+def test_interrupted_build_is_resumed_in_the_same_process(tmp_path, monkeypatch):
+	gen = generator(loads_grammer(source).P)
+	path = str(tmp_path / 'states.db')
+	successors = disk_state_store.successors
+	calls = 0
+	def interrupted(self, state):
+		nonlocal calls
+		if (calls := calls + 1) > 10: raise KeyboardInterrupt
+		return successors(self, state)
+	monkeypatch.setattr(disk_state_store, 'successors', interrupted)
+	with pytest.raises(KeyboardInterrupt):
+		lr1_generator(gen, store_path = path, checkpoint_every = 4)
+	monkeypatch.undo()
+
+	# the states of the last checkpoint are committed, the connection of the interrupted build is closed
+	with sqlite3.connect(path) as db:
+		assert db.execute("select value from meta where key = 'expanded'").fetchone()[0] == 8
+	resumed = lr1_generator(gen, store_path = path, checkpoint_every = 4)
+	built = lr1_generator(gen)
+	assert len(resumed.states) == len(built.states)
+	assert [dict(row) for row in resumed.goto] == [dict(row) for row in built.goto]
+	resumed.states.close()
@@ -0,0 +1,83 @@
+import random
+from grammer_preprocess import loads_grammer, generator, earley_parser, production
+from sentence_generator import sentence_generator
+
+
+def random_grammer(rnd, variables = 'SABC', terminals = 'abcd'):
+	P = []
+	for v in variables:
+		for k in range(rnd.randint(1, 3)):
+			body = [rnd.choice(variables + terminals) for i in range(rnd.randint(0, 3))]
+			P.append(production(v, body or ['ε']))
+	return generator(P, 'S')
+
+
+def corpus(gen, rnd, count = 60):
+	terminals = sorted(gen.g.T - {'$'}) or ['a']
+	toks = [[rnd.choice(terminals) for i in range(rnd.randint(0, 6))] for k in range(count)]
+	try:
+		sg = sentence_generator(gen, seed = rnd.random())
+		toks += [sg.tokens(ids) for ids, mutated in sg.stream(count, 8, mutation_rate = 0.5)]
+	except ValueError: # the language of S is empty
+		pass
+	return toks
+
+
+def test_leo_jump_over_the_start_variable():
+	gen = generator(loads_grammer('S : A | B d ; A : a ; B : S').P)
+	earley = earley_parser(gen)
+	assert earley.test(['a']) == (True, 0)
+	assert earley.test(['a', 'd', 'd']) == (True, 2)
+	assert earley.test(['a', 'a']) == (False, 1)
+
+
+def test_leo_agrees_with_the_plain_chart():
+	rnd = random.Random(44)
+	for trial in range(400):
+		gen = random_grammer(rnd)
+		earley = earley_parser(gen)
+		for toks in corpus(gen, rnd):
+			with_leo, filled = earley.chart_of(toks, leo = True)
+			without_leo, filled2 = earley.chart_of(toks, leo = False)
+			assert filled == filled2
+			accepted = filled > len(toks) and earley.accepted(with_leo, len(toks))
+			assert accepted == (filled2 > len(toks) and earley.accepted(without_leo, len(toks))), (gen.g.P, toks)
+			assert (earley.parse(toks) is not None) == accepted
+
+
+def test_right_recursion_stays_linear():
+	earley = earley_parser(generator(loads_grammer('S : a S | a').P))
+	chart, filled = earley.chart_of(['a'] * 200)
+	assert earley.accepted(chart, 200)
+	assert max(len(items) for items in chart) <= 6
+
+
+def yields(gen, tree):
+	# the tokens of tree, checking that each node is a production of gen
+	if isinstance(tree, str): return [tree]
+	head, subtrees = tree
+	body = [x if isinstance(x, str) else x[0] for x in subtrees]
+	assert any(p.head == head and [x for x in p.body if x != 'ε'] == body for p in gen.g.P), (head, body)
+	return [tok for x in subtrees for tok in yields(gen, x)]
+
+
+def test_parse_trees_derive_their_tokens():
+	rnd = random.Random(440)
+	for trial in range(300):
+		gen = random_grammer(rnd)
+		earley = earley_parser(gen)
+		for toks in corpus(gen, rnd):
+			if (tree := earley.parse(toks)) is not None:
+				assert tree[0] == 'S' and yields(gen, tree) == toks
+
+
+def test_parse_long_inputs():
+	# a tree as deep as the input is built without recursing once per token
+	for source in ('S : a S | a', 'S : S a | a', 'S : A S | A ; A : B ; B : a | A'):
+		tree = earley_parser(generator(loads_grammer(source).P)).parse(['a'] * 1000)
+		leaves, stack = [], [tree]
+		while stack:
+			node = stack.pop()
+			if isinstance(node, str): leaves.append(node)
+			else: stack.extend(reversed(node[1]))
+		assert leaves == ['a'] * 1000
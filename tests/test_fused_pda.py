@@ -0,0 +1,61 @@
+import random
+from grammer_preprocess import loads_grammer, generator, lalr_generator, lr1_generator, slr_generator, lr1_pda, slr_pda, fused_pda, end_token, action_category
+from sentence_generator import sentence_generator
+
+
+grammers = {
+	'expr': '''
+		E : E '+' T | T ;
+		T : T '*' F | F ;
+		F : '(' E ')' | id ;
+	''',
+	'lists': '''
+		S  : D E ;
+		D  : id '=' literal Dp | ':' ;
+		Dp : ',' id '=' literal Dp | ':' ;
+		E  : '[' L ']' | id | '-' E ;
+		L  : E Lp | ;
+		Lp : ',' E Lp | ;
+	''',
+	'chains': '''
+		S : A | S ';' A ;
+		A : B ;
+		B : C ;
+		C : x | '(' S ')' | ;
+	''',
+}
+
+
+def table_run(pda, toks):
+	# slr_pda.test step by step, with the reductions in order
+	stack, reduced, i = [0], [], 0
+	toks = list(toks) + [end_token()]
+	while True:
+		if (act := pda.action[stack[-1]].get(toks[i])) is None: return (False, i), reduced
+		category, arg = act
+		if category == action_category.SHIFT:
+			stack.append(arg)
+			i += 1
+		elif category == action_category.REDUCE:
+			p = pda.g.P[arg]
+			if p.body[0] != 'ε': del stack[-len(p.body):]
+			stack.append(pda.action[stack[-1]][p.head][1])
+			reduced.append(arg)
+		else:
+			return (True, i - 1), reduced
+
+
+def test_same_results_and_reductions():
+	rnd = random.Random(47)
+	for name, source in grammers.items():
+		gen = generator(loads_grammer(source).P)
+		sg = sentence_generator(gen, seed = 47)
+		corpus = [sg.tokens(ids) for ids, mutated in sg.stream(300, 10, mutation_rate = 0.6)]
+		terminals = sorted(gen.g.T - {'$'})
+		corpus += [[rnd.choice(terminals) for i in range(rnd.randint(0, 8))] for k in range(300)]
+		for pda in (lr1_pda(lalr_generator(gen)), lr1_pda(lr1_generator(gen)), slr_pda(slr_generator(gen))):
+			fused = fused_pda(pda)
+			assert fused.fused_steps > 0
+			for toks in corpus:
+				reduced = []
+				assert (fused.test(toks, on_reduce = reduced.append), reduced) == table_run(pda, toks), (name, toks)
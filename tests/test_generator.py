@@ -0,0 +1,83 @@
+import random
+from copy import copy
+import pytest
+from grammer_preprocess import generator, production, loads_grammer
+
+
+def random_grammer(rnd):
+	V, T = 'SABCD', 'abc'
+	P = [production('S', [rnd.choice(V[1:])])]
+	P += [production(rnd.choice(V), [rnd.choice(V + T) for i in range(rnd.randint(0, 3))] or ['ε']) for k in range(rnd.randint(4, 12))]
+	P += [production(v, [rnd.choice(T)]) for v in V]
+	return P
+
+
+def random_edit(rnd, P):
+	removed = list({p.key(): p for p in rnd.sample(P[1:], min(len(P) - 1, rnd.randint(0, 2)))}.values())
+	added = [production(rnd.choice('SABCD'), [rnd.choice('SABCDabc') for i in range(rnd.randint(0, 3))] or ['ε']) for k in range(rnd.randint(0, 2))]
+	return added, removed
+
+
+def analyses(gen):
+	return dict(gen.nullable), {x: set(s) for x, s in gen.first.items()}, {x: set(s) for x, s in gen.follow.items()}, [set(s) for s in gen.select], set(gen.g.V), set(gen.g.T)
+
+
+def test_delta_equals_a_fresh_analysis():
+	rnd = random.Random(26)
+	for trial in range(400):
+		gen = generator(random_grammer(rnd))
+		gen.select
+		for step in range(4):
+			gen.apply_delta(*random_edit(rnd, gen.g.P))
+			assert analyses(gen) == analyses(generator(list(gen.g.P), gen.g.S)), [str(p) for p in gen.g.P]
+
+
+def test_each_level_is_updated_when_it_is_asked_for():
+	rnd = random.Random(27)
+	for trial in range(200):
+		gen = generator(random_grammer(rnd))
+		gen.select
+		for step in range(3):
+			gen.apply_delta(*random_edit(rnd, gen.g.P))
+			fresh = generator(list(gen.g.P), gen.g.S)
+			assert gen.first == fresh.first and gen.nullable == fresh.nullable
+			assert gen.cached_version.get('follow') != gen.g.version and gen.cached_version.get('select') != gen.g.version
+			if rnd.random() < 0.5:
+				assert gen.follow == fresh.follow
+				assert gen.cached_version.get('select') != gen.g.version
+		assert analyses(gen) == analyses(generator(list(gen.g.P), gen.g.S))
+
+
+def test_start_variable_change():
+	gen = generator(loads_grammer('S : A b | ; A : a A | ;').P)
+	gen.select
+	gen.g.P = [production("S'", ['S'])] + gen.g.P
+	gen.update_sets()
+	assert gen.g.S == "S'" and gen.follow == generator(list(gen.g.P)).follow
+	assert gen.follow["S'"] == {'$'}
+
+
+def test_snapshots_are_isolated():
+	rnd = random.Random(36)
+	for trial in range(100):
+		gen = generator(random_grammer(rnd))
+		before = analyses(gen)
+		child = copy(gen)
+		child.apply_delta(*random_edit(rnd, child.g.P))
+		assert analyses(child) == analyses(generator(list(child.g.P), child.g.S))
+		assert analyses(gen) == before
+
+
+def test_matrix_backend():
+	pytest.importorskip('numpy')
+	rnd = random.Random(31)
+	for trial in range(100):
+		P = random_grammer(rnd)
+		assert analyses(generator(P, backend = 'matrix')) == analyses(generator(P))
+
+
+def test_merge_reports_the_states_saved(capsys):
+	gen = generator(loads_grammer("S : X Z ; X : a Xt ; Xt : ',' b Xt | ; Z : c Zt ; Zt : ',' b Zt | ;").P)
+	assert gen.merge_equivalent_variables() == {'Zt': 'Xt'}
+	before, after = capsys.readouterr().out.split('LR(0) states: ')[1].split(' -> ')
+	assert int(after) < int(before)
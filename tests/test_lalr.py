@@ -0,0 +1,100 @@
+import random
+from grammer_preprocess import loads_grammer, generator, production, lalr_generator, lr1_generator, lr1_pda
+
+
+def conflicted(lrgen) -> bool:
+	# a reduce/reduce or shift/reduce conflict in any state
+	for i, items in enumerate(lrgen.items_collection):
+		reduce = dict()
+		for item in items:
+			if not item.is_reduction_item(): continue
+			if reduce.setdefault(item.lookahead, item.prod) != item.prod or item.lookahead in lrgen.goto[i]: return True
+	return False
+
+
+def productive(gen) -> bool:
+	# every variable derives a terminal string, an LR(1) parser stops earlier on the useless ones than an LALR one
+	done = set()
+	while len(done) < len(gen.g.V):
+		new = {p.head for p in gen.g.P if all(x in done or x not in gen.g.V for x in p.body)}
+		if new <= done: return False
+		done |= new
+	return True
+
+
+def random_grammer(rnd, variables = 'SABC', terminals = 'abc'):
+	P = [production(v, [rnd.choice(variables + terminals) for i in range(rnd.randint(0, 3))] or ['ε'])
+		for v in variables for k in range(rnd.randint(1, 3))]
+	return generator(P, 'S')
+
+
+def corpus(gen, rnd, count = 40):
+	terminals = sorted(gen.g.T - {'$'}) or ['a']
+	return [[rnd.choice(terminals) for i in range(rnd.randint(0, 7))] for k in range(count)]
+
+
+nullable_lists = '''
+	S  : D E ;
+	D  : id '=' literal Dp | ':' ;
+	Dp : ',' id '=' literal Dp | ':' ;
+	E  : '[' L ']' | id ;
+	L  : E Lp | ;
+	Lp : ',' E Lp | ;
+'''
+
+
+def test_empty_reductions_of_the_closure():
+	gen = generator(loads_grammer(nullable_lists).P)
+	lalr, lr1 = lr1_pda(lalr_generator(gen)), lr1_pda(lr1_generator(gen))
+	for s in ('id = literal , id = literal : [ ]', ': [ id , [ ] ]', ': [ ]', ': [ id , ]', ': id id'):
+		toks = s.split()
+		assert lalr.test(toks) == lr1.test(toks), s
+	assert lalr.test(': [ ]'.split()) == (True, 2)
+
+
+def test_lalr_recognizes_as_lr1():
+	rnd = random.Random(29)
+	compared = 0
+	while compared < 60:
+		gen = random_grammer(rnd)
+		lalr, lr1 = lalr_generator(gen), lr1_generator(gen)
+		if not productive(gen) or conflicted(lalr) or conflicted(lr1): continue
+		compared += 1
+		lalr_pda, lr1_pda_ = lr1_pda(lalr), lr1_pda(lr1)
+		for toks in corpus(gen, rnd):
+			# an LALR parser may reduce more before an error, but it stops at the same token
+			assert lalr_pda.test(toks) == lr1_pda_.test(toks), (gen.g.P, toks)
+
+
+def automaton(lalr) -> dict:
+	# the states by their kernel cores, with their items and gotos, independent of the state ids
+	key = lambda i: frozenset((item.prod.key(), item.ppos) for item in lalr.states.kernel_items(i))
+	return {key(i): (frozenset((item.prod.key(), item.ppos, str(item.lookahead)) for item in lalr.items_collection[i]),
+		frozenset((X, key(t)) for X, t in lalr.goto[i].items())) for i in range(len(lalr.goto))}
+
+
+def test_update_turns_a_terminal_into_a_variable():
+	lalr = lalr_generator(generator(loads_grammer('S : B ; A : S | a a ;').P))
+	P = list(lalr.g.P[max(lalr.starts) + 1:]) + [production('B', ['b'])]
+	assert automaton(lalr.update(P)) == automaton(lalr_generator(generator(P)))
+
+
+def test_update_equals_a_full_build():
+	rnd = random.Random(45)
+	for source in (nullable_lists, 'S : B ; A : S | a a ;', "E : E '+' T | T ; T : T '*' F | F ; F : '(' E ')' | id ;"):
+		lalr = lalr_generator(generator(loads_grammer(source).P))
+		k = max(lalr.starts) + 1
+		start = lalr.g.P[k].head
+		# a terminal as the head of a new production turns into a variable, so does a new symbol N
+		symbols = sorted((lalr.gen.g.V | lalr.gen.g.T) - {'$', lalr.g.P[0].head}) + ['N']
+		heads = [x for x in symbols if x != start]
+		for edit in range(150):
+			P = list(lalr.g.P[k:])
+			if rnd.random() < 0.4 and len(P) > 1:
+				# a variable losing its last production turns into a terminal
+				del P[rnd.randrange(1, len(P))]
+			else:
+				P.insert(rnd.randrange(1, len(P) + 1), production(rnd.choice(heads), [rnd.choice(symbols) for i in range(rnd.randint(0, 3))] or ['ε']))
+			updated = lalr.update(P)
+			assert automaton(updated) == automaton(lalr_generator(generator(P))), [str(p) for p in P]
+			if rnd.random() < 0.5: lalr = updated
@@ -0,0 +1,62 @@
+import pytest
+from grammer_preprocess import loads_grammer, load_grammer, grammer_error, production
+
+
+def test_rules_and_declarations():
+	spec = loads_grammer('''
+		%token id
+		%left '+' '-'
+		%left '*'
+		%%
+		E : E '+' E      { $$ = $1 + $3; }
+		  | E '*' E
+		  | id
+		  | /* empty */ %empty
+		  ;
+	''')
+	assert spec.S == 'E'
+	assert spec.P == [production('E', ['E', '+', 'E']), production('E', ['E', '*', 'E']), production('E', ['id']), production('E', ['ε'])]
+	assert spec.tokens == {'id', '+', '-', '*'}
+	assert spec.precedence['+'] == (1, 'left') and spec.precedence['-'] == (1, 'left') and spec.precedence['*'] == (2, 'left')
+
+
+def test_arrows_without_declarations():
+	spec = loads_grammer('''
+		S -> a S b ;
+		S -> | c
+	''')
+	assert spec.S == 'S'
+	assert spec.P == [production('S', ['a', 'S', 'b']), production('S', ['ε']), production('S', ['c'])]
+
+
+def test_prec_follows_its_production_when_start_is_not_first():
+	spec = loads_grammer('''
+		%token id a
+		%left '-'
+		%right UMINUS
+		%start E
+		%%
+		X : a ;
+		E : E '-' E
+		  | '-' E %prec UMINUS
+		  | X
+		  | id
+		  ;
+	''')
+	assert spec.P[0].head == 'E'
+	assert [(spec.P[i], t) for i, t in spec.production_precedence.items()] == [(production('E', ['-', 'E']), 'UMINUS')]
+
+
+def test_errors_have_positions():
+	with pytest.raises(grammer_error) as e:
+		loads_grammer('%token a\n%%\nS : a b ;')
+	assert e.value.lineno == 3
+	with pytest.raises(grammer_error):
+		loads_grammer('%start T\n%%\nS : a ;')
+	with pytest.raises(grammer_error):
+		loads_grammer('S : a /* unterminated')
+
+
+def test_files_and_lines(tmp_path):
+	(path := tmp_path / 'g.y').write_text('S : a S | b ;\n')
+	assert load_grammer(str(path)).P == load_grammer(['S : a S | b ;']).P
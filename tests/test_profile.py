@@ -0,0 +1,27 @@
+from grammer_preprocess import loads_grammer, generator, lalr_generator, lr1_pda, parse_profile, end_token, action_category
+
+
+def deepest_stack(pda, toks):
+	stack, i, deepest = [0], 0, 1
+	toks = list(toks) + [end_token()]
+	while (act := pda.action[stack[-1]].get(toks[i])) is not None and act[0] != action_category.ACCEPT:
+		if act[0] == action_category.SHIFT:
+			stack.append(act[1])
+			i += 1
+		else:
+			p = pda.g.P[act[1]]
+			if p.body[0] != 'ε': del stack[-len(p.body):]
+			stack.append(pda.action[stack[-1]][p.head][1])
+		deepest = max(deepest, len(stack))
+	return deepest
+
+
+def test_profile_counts_the_empty_reductions():
+	# every B reduces by B -> ε before the next a is shifted
+	gen = generator(loads_grammer('S : A x ; A : a B A | ; B : ;').P)
+	pda = lr1_pda(lalr_generator(gen))
+	for toks in (['x'], ['a', 'x'], ['a', 'a', 'a', 'x'], ['a', 'a', 'y']):
+		profile = parse_profile()
+		assert pda.profile(toks, profile) == pda.test(toks)
+		assert profile.max_depth == deepest_stack(pda, toks)
+		assert profile.runs == 1
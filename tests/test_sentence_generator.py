@@ -0,0 +1,12 @@
+from grammer_preprocess import loads_grammer, generator, earley_parser
+from sentence_generator import sentence_generator
+
+
+def test_sentences_reach_the_target_length():
+	# the recursive productions of L and S add no terminals, only the variables they push can grow
+	for source in ('L : L I | ; I : x | O ; O : | y', 'S : S B | a ; B : | b', "E : E '+' T | T ; T : T '*' F | F ; F : '(' E ')' | id"):
+		gen = generator(loads_grammer(source).P)
+		sg, earley = sentence_generator(gen, seed = 48), earley_parser(gen)
+		sentences = [sg.tokens(sg.sentence(30)) for i in range(200)]
+		assert 20 <= sum(map(len, sentences)) / len(sentences) <= 30, source
+		assert all(earley.test(toks)[0] is True for toks in sentences)
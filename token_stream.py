@@ -0,0 +1,175 @@
+'''
+
+token_stream.py
+
+	a compact binary token stream, read through mmap without copying the tokens:
+
+	header      magic b'TOKS', version: u16, flags: u16, count: u64, terminals: u32   (little endian)
+	dictionary  for each terminal: length: u16, utf-8 bytes;  terminal id = its index
+	            zero padding up to a multiple of 8
+	ids         int32 [count]
+	spans       only if flags & HAS_SPANS:  starts int64 [count], ends int64 [count]  (source offsets)
+
+	token_stream        reads a file by mmap, ids / starts / ends are memoryviews into the mapping
+	write_token_stream  writes the ids (and spans) of a terminal dictionary
+	convert_tokens      converts the list[str] of slr_pda.test into a stream file
+	parse_stream        runs a slr_pda / lr1_pda / parse_service.parse_tables on the ids directly
+
+	usage:
+	python token_stream.py convert <text file> <stream file>   whitespace separated tokens -> stream
+	python token_stream.py dump <stream file>                  stream -> tokens
+
+'''
+
+
+import sys
+import mmap
+import struct
+from array import array
+from grammer_preprocess import end_token, action_category
+
+
+MAGIC = b'TOKS'
+VERSION = 1
+HAS_SPANS = 1
+header_format = struct.Struct('<4sHHQI')
+
+
+class token_stream:
+	# terminals: id -> terminal
+	# ids      : memoryview of int32, starts / ends: memoryview of int64 or None
+	def __init__(self, path):
+		self.file = open(path, 'rb')
+		self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+		magic, version, flags, count, terminals_count = header_format.unpack_from(self.map, 0)
+		if magic != MAGIC: raise ValueError('{} is not a token stream'.format(path))
+		if version != VERSION: raise ValueError('unsupported token stream version {}'.format(version))
+
+		offset = header_format.size
+		self.terminals = list[str]()
+		for i in range(terminals_count):
+			(length, ) = struct.unpack_from('<H', self.map, offset)
+			self.terminals.append(bytes(self.map[offset + 2: offset + 2 + length]).decode())
+			offset += 2 + length
+		offset += -offset % 8
+
+		view = memoryview(self.map)
+		self.ids = self.view(view, offset, count, 'i', 4)
+		offset += 4 * count
+		offset += -offset % 8
+		self.starts = self.ends = None
+		if flags & HAS_SPANS:
+			self.starts = self.view(view, offset, count, 'q', 8)
+			self.ends = self.view(view, offset + 8 * count, count, 'q', 8)
+
+	@staticmethod
+	def view(view, offset, count, typecode, size):
+		if sys.byteorder == 'little': return view[offset: offset + size * count].cast(typecode)
+		a = array(typecode, view[offset: offset + size * count]) # a big endian machine has to copy
+		a.byteswap()
+		return memoryview(a)
+
+	def __len__(self):
+		return len(self.ids)
+
+	def tokens(self) -> list[str]:
+		# the list[str] of slr_pda.test
+		return [self.terminals[i] for i in self.ids]
+
+	def span(self, i) -> tuple[int, int]:
+		return (self.starts[i], self.ends[i]) if self.starts is not None else None
+
+	def close(self):
+		# the memoryviews must be released before the mapping
+		for v in (self.ids, self.starts, self.ends):
+			if v is not None: v.release()
+		self.map.close()
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+def write_token_stream(f, terminals, ids, starts = None, ends = None):
+	# f: a binary file, terminals: id -> terminal, ids: iterable of terminal ids
+	ids = ids if isinstance(ids, array) and ids.typecode == 'i' else array('i', ids)
+	has_spans = starts is not None
+	f.write(header_format.pack(MAGIC, VERSION, HAS_SPANS if has_spans else 0, len(ids), len(terminals)))
+	size = header_format.size
+	for t in terminals:
+		b = t.encode()
+		f.write(struct.pack('<H', len(b)) + b)
+		size += 2 + len(b)
+	f.write(bytes(-size % 8))
+	size += -size % 8
+	for a in ((ids, array('q', starts), array('q', ends)) if has_spans else (ids, )):
+		if sys.byteorder != 'little':
+			a = array(a.typecode, a)
+			a.byteswap()
+		a.tofile(f)
+		size += a.itemsize * len(a)
+		f.write(bytes(-size % 8))
+		size += -size % 8
+
+
+def convert_tokens(toks: list[str], f, spans = None, terminals = None):
+	# toks: the list[str] of slr_pda.test, spans: [(start, end), ...] or None
+	# terminals: the dictionary to use, by default the terminals in the order of their first appearance
+	terminal_id = {t: i for i, t in enumerate(terminals)} if terminals is not None else dict()
+	ids = array('i', (terminal_id.setdefault(t, len(terminal_id)) for t in toks))
+	if spans is None:
+		write_token_stream(f, list(terminal_id), ids)
+	else:
+		write_token_stream(f, list(terminal_id), ids, (s for s, e in spans), (e for s, e in spans))
+
+
+def parse_stream(pda, stream: token_stream, entry = None) -> tuple:
+	# the same as slr_pda.test on stream.tokens(), but the action rows are re-keyed by the terminal ids of
+	# the stream, so the ids are read from the mapping as they are and no list[str] is made
+	if hasattr(pda, 'lengths'): # parse_service.parse_tables
+		lengths, heads = pda.lengths, pda.heads
+	else:
+		lengths = [len(p.body) if p.body[0] != 'ε' else 0 for p in pda.g.P]
+		heads = [p.head for p in pda.g.P]
+	action = pda.action
+	id_action = [[row.get(t) for t in stream.terminals] for row in action]
+	end = end_token()
+
+	stack = [pda.entries[entry] if entry is not None else 0]
+	for index, tok in enumerate(stream.ids):
+		while True:
+			if (act := id_action[stack[-1]][tok]) is None: return (False, index)
+			category, arg = act
+			if category == action_category.SHIFT:
+				stack.append(arg)
+				break
+			elif category == action_category.REDUCE:
+				if lengths[arg]: del stack[-lengths[arg]:]
+				stack.append(action[stack[-1]][heads[arg]][1])
+			else:
+				return (False, 'bad teble at index ' + str(index))
+	index = len(stream.ids)
+	while True:
+		if (act := action[stack[-1]].get(end)) is None: return (False, index)
+		category, arg = act
+		if category == action_category.REDUCE:
+			if lengths[arg]: del stack[-lengths[arg]:]
+			stack.append(action[stack[-1]][heads[arg]][1])
+		elif category == action_category.ACCEPT:
+			return (True, index - 1)
+		else:
+			return (False, 'bad teble at index ' + str(index))
+
+
+if __name__ == '__main__':
+	if len(sys.argv) == 4 and sys.argv[1] == 'convert':
+		with open(sys.argv[2]) as src, open(sys.argv[3], 'wb') as dst:
+			convert_tokens(src.read().split(), dst)
+	elif len(sys.argv) == 3 and sys.argv[1] == 'dump':
+		with token_stream(sys.argv[2]) as stream:
+			print(' '.join(stream.tokens()))
+	else:
+		print(__doc__)